@@ -0,0 +1,100 @@
+"""
+Requests/sec of the sync (gunicorn wsgi) and async (uvicorn asgi) servers
+on the same read paths and the same database.
+
+    DATABASE_URL=... python benchmarks/async_vs_sync.py --concurrency 32 --duration 10
+
+Both servers are started here with the settings from gunicorn.conf.py /
+the environment; the result is printed and written as JSON (--output).
+"""
+import argparse
+import http.client
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PATHS = ["/people?limit=50", "/planets/1", "/species?limit=50", "/vehicles/1", "/users/favorites"]
+SERVERS = {
+    "sync": ["gunicorn", "wsgi", "--chdir", "./src/", "--bind", "127.0.0.1:{port}"],
+    "async": [sys.executable, "-m", "uvicorn", "asgi:application", "--app-dir", "src",
+              "--port", "{port}", "--workers", "{workers}", "--log-level", "warning"],
+}
+
+def wait_until_up(port, timeout=20):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", PATHS[0])
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server on port %d did not start" % port)
+
+def load(port, concurrency, duration):
+    counts = [0] * concurrency
+    errors = [0] * concurrency
+    stop = time.time() + duration
+
+    def client(slot):
+        connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+        i = slot
+        while time.time() < stop:
+            try:
+                connection.request("GET", PATHS[i % len(PATHS)])
+                response = connection.getresponse()
+                response.read()
+                if response.status == 200:
+                    counts[slot] += 1
+                else:
+                    errors[slot] += 1
+            except (OSError, http.client.HTTPException):
+                errors[slot] += 1
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+            i += 1
+
+    threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+    started = time.time()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.time() - started
+    return {"requests": sum(counts), "errors": sum(errors), "seconds": elapsed, "rps": sum(counts) / elapsed}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=int(os.getenv("WEB_CONCURRENCY", 2)))
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="bench_async_vs_sync.json")
+    args = parser.parse_args()
+
+    env = dict(os.environ, WEB_CONCURRENCY=str(args.workers))
+    results = {"concurrency": args.concurrency, "duration": args.duration, "workers": args.workers, "paths": PATHS}
+    for mode, command in SERVERS.items():
+        command = [part.format(port=args.port, workers=args.workers) for part in command]
+        server = subprocess.Popen(command, cwd=ROOT, env=env)
+        try:
+            wait_until_up(args.port)
+            load(args.port, args.concurrency, 1)  # warm up pools and caches
+            results[mode] = load(args.port, args.concurrency, args.duration)
+        finally:
+            server.terminate()
+            server.wait()
+        print("%-5s %8.1f req/s  (%d requests, %d errors)" % (
+            mode, results[mode]["rps"], results[mode]["requests"], results[mode]["errors"]))
+
+    results["speedup"] = results["async"]["rps"] / results["sync"]["rps"] if results["sync"]["rps"] else None
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print("async/sync: %.2fx, saved to %s" % (results["speedup"] or 0, args.output))
+
+if __name__ == "__main__":
+    main()
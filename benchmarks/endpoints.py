@@ -0,0 +1,240 @@
+"""
+Latency, throughput and query counts for every GET endpoint of src/app.py,
+through the Flask test client (no network, one thread) and over HTTP
+(gunicorn with gunicorn.conf.py, --concurrency client threads).
+
+    FLASK_APP=src/app.py flask data generate --yes      # reproducible dataset
+    python benchmarks/endpoints.py --requests 200 --output bench_endpoints.json
+    python benchmarks/endpoints.py --compare bench_endpoints.json   # on another commit
+
+Endpoints are read from app.url_map, so new routes are picked up without
+touching this file; <int:id> is filled with random existing ids (fixed
+--seed). Query counts come from the Server-Timing header. --writes adds
+favorite create/delete pairs, which leave the data as they found it.
+Results are saved as JSON (p50/p95/p99 in ms, req/s, queries/request)
+together with the commit and row counts, so runs can be diffed.
+"""
+import argparse
+import http.client
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+SKIP = ("/", "/static/<path:filename>", "/metrics", "/cache/stats", "/pool/stats")
+# interesting query strings on top of each plain GET rule
+VARIANTS = {
+    "/people": ["?limit=50", "?limit=50&fields=id,name", "?sort=-height&limit=50", "?species_id=1&limit=50"],
+    "/planets": ["?limit=50", "?population__gte=1000000&limit=50", "?sort=-diameter&limit=50"],
+    "/species": ["?limit=50"],
+    "/vehicles": ["?limit=50", "?sort=crew&limit=50"],
+    "/users": ["?limit=50", "?limit=50&fields=id,name", "?limit=50&embed=favorites"],
+    "/search": ["?q=ka", "?q=kalo&type=planet"],
+    "/favorites/top": ["?type=person", "?type=planet&limit=50"],
+}
+# these 400 without a query string
+NEEDS_QUERY = ("/search", "/favorites/top")
+ID_TABLES = {"/people/": "people", "/planets/": "planets", "/species/": "species", "/vehicles/": "vehicles",
+             "/users/": "users", "/favorite/people/": "people", "/favorite/planet/": "planets",
+             "/favorite/species/": "species", "/favorite/vehicle/": "vehicles"}
+TIMING_QUERIES = re.compile(r'desc="(\d+) queries"')
+
+def max_ids(app, db):
+    with app.app_context():
+        return {
+            table: db.session.execute(db.text("SELECT coalesce(max(id), 0) FROM %s" % table)).scalar()
+            for table in sorted(set(ID_TABLES.values()) | {"favorites"})
+        }
+
+def scenarios(app, ids, writes):
+    """name -> list of (method, url-template); {id} is filled per request."""
+    found = {}
+    for rule in app.url_map.iter_rules():
+        if rule.rule in SKIP or rule.rule.startswith("/admin"):
+            continue
+        path = rule.rule.replace("<int:id>", "{id}")
+        table = next((table for prefix, table in ID_TABLES.items() if path.startswith(prefix)), None)
+        if "{" in path.replace("{id}", "") or ("{id}" in path and not ids.get(table)):
+            continue
+        if "GET" in rule.methods:
+            plain = [] if rule.rule in NEEDS_QUERY else [""]
+            for query in plain + VARIANTS.get(rule.rule, []):
+                found["GET " + rule.rule + query] = (table, [("GET", path + query)])
+        if writes and rule.rule.startswith("/favorite/") and "POST" in rule.methods:
+            found["POST+DELETE " + rule.rule] = (table, [("POST", path), ("DELETE", path)])
+    return found
+
+def percentile(samples, q):
+    return statistics.quantiles(samples, n=100, method="inclusive")[q - 1] if len(samples) > 1 else samples[0]
+
+def summarize(latencies, queries, errors, seconds):
+    latencies = sorted(latencies)
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+        "rps": len(latencies) / seconds if seconds else None,
+        "queries_per_request": statistics.mean(queries) if queries else None,
+    }
+
+def query_count(server_timing):
+    match = TIMING_QUERIES.search(server_timing or "")
+    return int(match.group(1)) if match else None
+
+def run_client(app, found, ids, requests, rng):
+    client = app.test_client()
+    results = {}
+    for name, (table, steps) in sorted(found.items()):
+        latencies, queries, errors = [], [], 0
+        started = time.perf_counter()
+        for _ in range(requests):
+            id = rng.randint(1, ids[table]) if table else None
+            for method, path in steps:
+                begin = time.perf_counter()
+                response = client.open(path.format(id=id), method=method)
+                response.get_data()
+                latencies.append(time.perf_counter() - begin)
+                if response.status_code >= 400 and method == "GET":
+                    errors += 1
+                count = query_count(response.headers.get("Server-Timing"))
+                if count is not None:
+                    queries.append(count)
+                response.close()
+        results[name] = summarize(latencies, queries, errors, time.perf_counter() - started)
+    return results
+
+def wait_until_up(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=1)
+            connection.request("GET", "/pool/stats")
+            connection.getresponse().read()
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError("server on port %d did not start" % port)
+
+def run_http(found, ids, requests, concurrency, port, rng):
+    server = subprocess.Popen(["gunicorn", "wsgi", "--chdir", "./src/", "--bind", "127.0.0.1:%d" % port], cwd=ROOT)
+    try:
+        wait_until_up(port)
+        results = {}
+        for name, (table, steps) in sorted(found.items()):
+            plan = [rng.randint(1, ids[table]) if table else None for _ in range(requests)]
+            latencies, queries, errors = [], [], [0]
+            lock = threading.Lock()
+
+            def client(slot):
+                connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                for id in plan[slot::concurrency]:
+                    for method, path in steps:
+                        begin = time.perf_counter()
+                        try:
+                            connection.request(method, path.format(id=id))
+                            response = connection.getresponse()
+                            response.read()
+                        except (OSError, http.client.HTTPException):
+                            with lock:
+                                errors[0] += 1
+                            connection = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+                            continue
+                        elapsed = time.perf_counter() - begin
+                        with lock:
+                            latencies.append(elapsed)
+                            if response.status >= 400 and method == "GET":
+                                errors[0] += 1
+                            count = query_count(response.getheader("Server-Timing"))
+                            if count is not None:
+                                queries.append(count)
+
+            threads = [threading.Thread(target=client, args=(slot,)) for slot in range(concurrency)]
+            started = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            results[name] = summarize(latencies, queries, errors[0], time.perf_counter() - started)
+        return results
+    finally:
+        server.terminate()
+        server.wait()
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_results(mode, results, baseline=None):
+    print("\n[%s]" % mode)
+    print("%-58s %9s %9s %9s %9s %7s" % ("endpoint", "p50 ms", "p95 ms", "p99 ms", "req/s", "queries"))
+    for name, stats in results.items():
+        line = "%-58s %9.2f %9.2f %9.2f %9.1f %7s" % (
+            name[:58], stats["p50_ms"], stats["p95_ms"], stats["p99_ms"], stats["rps"] or 0,
+            "-" if stats["queries_per_request"] is None else "%.1f" % stats["queries_per_request"])
+        old = (baseline or {}).get(name)
+        if old:
+            line += "   p50 %+.0f%%  p95 %+.0f%%" % (
+                (stats["p50_ms"] / old["p50_ms"] - 1) * 100, (stats["p95_ms"] / old["p95_ms"] - 1) * 100)
+        print(line)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mode", choices=("client", "http", "both"), default="both")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=8, help="HTTP client threads")
+    parser.add_argument("--port", type=int, default=8766)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--writes", action="store_true", help="also favorite/unfavorite random items")
+    parser.add_argument("--no-cache", action="store_true", help="run with RESPONSE_CACHE_SIZE=0")
+    parser.add_argument("--output", default="bench_endpoints.json")
+    parser.add_argument("--compare", help="earlier JSON output to diff against")
+    args = parser.parse_args()
+
+    if args.no_cache:
+        os.environ["RESPONSE_CACHE_SIZE"] = "0"
+    from app import app
+    from models import db
+    ids = max_ids(app, db)
+    found = scenarios(app, ids, args.writes)
+    baseline = None
+    if args.compare:
+        with open(args.compare) as previous:
+            baseline = json.load(previous)
+
+    results = {
+        "commit": git_commit(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "rows": ids,
+        "requests_per_endpoint": args.requests,
+        "concurrency": args.concurrency,
+        "response_cache": os.getenv("RESPONSE_CACHE_SIZE", "default"),
+    }
+    with app.app_context():
+        results["database"] = db.engine.dialect.name
+    if args.mode in ("client", "both"):
+        results["client"] = run_client(app, found, ids, args.requests, random.Random(args.seed))
+        print_results("test client", results["client"], (baseline or {}).get("client"))
+    if args.mode in ("http", "both"):
+        results["http"] = run_http(found, ids, args.requests, args.concurrency, args.port, random.Random(args.seed))
+        print_results("http", results["http"], (baseline or {}).get("http"))
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print("\nsaved to %s" % args.output)
+
+if __name__ == "__main__":
+    main()
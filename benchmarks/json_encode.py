@@ -0,0 +1,89 @@
+"""
+Encode time of each JSON provider in src/json_provider.py on real list
+payloads (the same dicts the list endpoints pass to jsonify).
+
+    FLASK_APP=src/app.py flask data generate --yes      # reproducible dataset
+    python benchmarks/json_encode.py --rows 10000 --repeat 20
+
+Providers that aren't installed are skipped. Every provider's output is
+decoded and compared with the stdlib one before timing, so a faster encoder
+that changes the response is reported instead of measured.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+TABLES = ("people", "planets", "species", "vehicles")
+
+def payloads(app, db, rows):
+    from models import People, Planets, Species, Vehicles
+    from projections import projection_query, project_rows
+    models = {"people": People, "planets": Planets, "species": Species, "vehicles": Vehicles}
+    with app.app_context():
+        found = {}
+        for table in TABLES:
+            model = models[table]
+            items = project_rows(model, db.session.execute(projection_query(model).order_by(model.id).limit(rows)))
+            if items:
+                found[table] = items
+        return found
+
+def measure(provider, payload, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        provider.response(payload).get_data()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=10000, help="items per payload")
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--output", default="bench_json_encode.json")
+    args = parser.parse_args()
+
+    from app import app
+    from models import db
+    from json_provider import PROVIDERS
+    providers = {name: provider_class(app) for name, provider_class in PROVIDERS.items() if provider_class is not None}
+    found = payloads(app, db, args.rows)
+
+    results = {"rows": args.rows, "repeat": args.repeat, "payloads": {}}
+    print("%-10s %-10s %10s %10s %10s %9s" % ("payload", "provider", "median ms", "min ms", "bytes", "speedup"))
+    with app.app_context():
+        for table, payload in found.items():
+            expected = json.loads(providers["stdlib"].response(payload).get_data())
+            baseline = None
+            results["payloads"][table] = {"items": len(payload)}
+            # stdlib first: the others are reported relative to it
+            for name in sorted(providers, key=lambda name: name != "stdlib"):
+                body = providers[name].response(payload).get_data()
+                if json.loads(body) != expected:
+                    print("%-10s %-10s output differs from stdlib, skipped" % (table, name))
+                    results["payloads"][table][name] = {"error": "output differs from stdlib"}
+                    continue
+                samples = measure(providers[name], payload, args.repeat)
+                median = statistics.median(samples)
+                baseline = median if baseline is None else baseline
+                results["payloads"][table][name] = stats = {
+                    "median_ms": median * 1000,
+                    "min_ms": min(samples) * 1000,
+                    "bytes": len(body),
+                    "speedup": baseline / median,
+                }
+                print("%-10s %-10s %10.2f %10.2f %10d %8.1fx" % (
+                    table, name, stats["median_ms"], stats["min_ms"], stats["bytes"], stats["speedup"]))
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+    print("\nsaved to %s" % args.output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,10 @@
+# Picked up automatically by `gunicorn wsgi --chdir ./src/` (Procfile, render.yaml).
+# Keep DB_POOL_SIZE >= threads: every thread of a worker may hold a connection.
+# Pooled connections are dropped in each worker after fork, see src/database.py.
+import os
+
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 30))
+preload_app = os.getenv("GUNICORN_PRELOAD", "false").lower() == "true"
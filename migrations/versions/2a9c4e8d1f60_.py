@@ -0,0 +1,28 @@
+"""indexes on the people/species foreign keys
+
+Revision ID: 2a9c4e8d1f60
+Revises: d7a3e5f19b42
+Create Date: 2026-10-17 12:26:51.904127
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2a9c4e8d1f60'
+down_revision = 'd7a3e5f19b42'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index(op.f('ix_people_species_id'), 'people', ['species_id'], unique=False)
+    op.create_index(op.f('ix_people_homeworld_id'), 'people', ['homeworld_id'], unique=False)
+    op.create_index(op.f('ix_species_homeworld_id'), 'species', ['homeworld_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_species_homeworld_id'), table_name='species')
+    op.drop_index(op.f('ix_people_homeworld_id'), table_name='people')
+    op.drop_index(op.f('ix_people_species_id'), table_name='people')
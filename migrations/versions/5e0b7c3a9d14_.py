@@ -0,0 +1,36 @@
+"""favorite_count on the favoritable tables
+
+Revision ID: 5e0b7c3a9d14
+Revises: 2a9c4e8d1f60
+Create Date: 2026-10-17 13:08:37.562210
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e0b7c3a9d14'
+down_revision = '2a9c4e8d1f60'
+branch_labels = None
+depends_on = None
+
+TABLES = {'people': 'person', 'planets': 'planet', 'species': 'species', 'vehicles': 'vehicle'}
+
+
+def upgrade():
+    for table, item_type in TABLES.items():
+        # plain ADD/DROP COLUMN: a batch copy of the table would lose the
+        # search_index triggers on SQLite
+        op.add_column(table, sa.Column('favorite_count', sa.Integer(), server_default='0', nullable=False))
+        op.execute(
+            "UPDATE %s SET favorite_count = (SELECT count(*) FROM favorites "
+            "WHERE favorites.item_type = '%s' AND favorites.item_id = %s.id)" % (table, item_type, table)
+        )
+        op.create_index('ix_%s_favorite_count' % table, table, [sa.text('favorite_count DESC'), 'id'], unique=False)
+
+
+def downgrade():
+    for table in TABLES:
+        op.drop_index('ix_%s_favorite_count' % table, table_name=table)
+        op.drop_column(table, 'favorite_count')
@@ -0,0 +1,36 @@
+"""favorites lookup index and one favorite per user and item
+
+Revision ID: 8b3d0c5e7a21
+Revises: 1f13bfc63e52
+Create Date: 2026-10-17 09:12:41.305118
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8b3d0c5e7a21'
+down_revision = '1f13bfc63e52'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # the old duplicate check in create_fav_person never matched, drop the repeats
+    # before the unique constraint goes on
+    op.execute(
+        "DELETE FROM favorites WHERE id NOT IN ("
+        "SELECT keep_id FROM (SELECT MIN(id) AS keep_id FROM favorites "
+        "GROUP BY user_id, item_type, item_id) AS keep)"
+    )
+
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.create_unique_constraint('uq_favorites_user_item', ['user_id', 'item_type', 'item_id'])
+        batch_op.create_index('ix_favorites_item', ['item_type', 'item_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('favorites', schema=None) as batch_op:
+        batch_op.drop_index('ix_favorites_item')
+        batch_op.drop_constraint('uq_favorites_user_item', type_='unique')
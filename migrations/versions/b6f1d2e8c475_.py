@@ -0,0 +1,36 @@
+"""(column, id) indexes on the ?sort= columns
+
+Revision ID: b6f1d2e8c475
+Revises: 5e0b7c3a9d14
+Create Date: 2026-10-18 09:14:52.106318
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b6f1d2e8c475'
+down_revision = '5e0b7c3a9d14'
+branch_labels = None
+depends_on = None
+
+# sort_columns of each model in src/models.py
+SORT_COLUMNS = {
+    'people': ('name', 'height', 'mass'),
+    'planets': ('name', 'surface_water', 'diameter', 'orbital_period', 'population'),
+    'species': ('name', 'average_lifespan', 'average_height'),
+    'vehicles': ('name', 'cargo_capacity', 'max_atmosphering_speed', 'crew', 'length'),
+}
+
+
+def upgrade():
+    for table, columns in SORT_COLUMNS.items():
+        for column in columns:
+            op.create_index('ix_%s_%s_id' % (table, column), table, [column, 'id'], unique=False)
+
+
+def downgrade():
+    for table, columns in SORT_COLUMNS.items():
+        for column in columns:
+            op.drop_index('ix_%s_%s_id' % (table, column), table_name=table)
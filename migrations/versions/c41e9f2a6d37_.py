@@ -0,0 +1,32 @@
+"""per-table version counters for ETags
+
+Revision ID: c41e9f2a6d37
+Revises: 8b3d0c5e7a21
+Create Date: 2026-10-17 10:03:18.447152
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c41e9f2a6d37'
+down_revision = '8b3d0c5e7a21'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    table_versions = op.create_table('table_versions',
+    sa.Column('table_name', sa.String(length=64), nullable=False),
+    sa.Column('version', sa.BigInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('table_name')
+    )
+    op.bulk_insert(table_versions, [
+        {'table_name': table_name, 'version': 0}
+        for table_name in ('users', 'favorites', 'people', 'planets', 'species', 'vehicles')
+    ])
+
+
+def downgrade():
+    op.drop_table('table_versions')
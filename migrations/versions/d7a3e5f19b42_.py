@@ -0,0 +1,61 @@
+"""name search: lower(name) prefix indexes, FTS5 (sqlite) / trigram + tsvector (postgresql)
+
+Revision ID: d7a3e5f19b42
+Revises: c41e9f2a6d37
+Create Date: 2026-10-17 11:42:05.318904
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd7a3e5f19b42'
+down_revision = 'c41e9f2a6d37'
+branch_labels = None
+depends_on = None
+
+# search_index rowid = id * 4 + position in this tuple, as in src/search.py
+TABLES = ('people', 'planets', 'species', 'vehicles')
+
+
+def upgrade():
+    dialect = op.get_bind().dialect.name
+    for table in TABLES:
+        if dialect == 'postgresql':
+            # postgresql_ops can't name a text() expression, so the opclass goes in the DDL
+            op.execute("CREATE INDEX ix_%s_name_lower ON %s (lower(name) text_pattern_ops)" % (table, table))
+        else:
+            op.create_index('ix_%s_name_lower' % table, table, [sa.text('lower(name)')])
+
+    if dialect == 'postgresql':
+        op.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for table in TABLES:
+            op.execute("CREATE INDEX ix_%s_name_tsv ON %s USING gin (to_tsvector('simple', name))" % (table, table))
+            op.execute("CREATE INDEX ix_%s_name_trgm ON %s USING gin (name gin_trgm_ops)" % (table, table))
+    elif dialect == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE search_index USING fts5(name, prefix='2 3')")
+        for code, table in enumerate(TABLES):
+            op.execute("CREATE TRIGGER %s_search_insert AFTER INSERT ON %s BEGIN "
+                       "INSERT INTO search_index (rowid, name) VALUES (new.id * 4 + %d, new.name); END" % (table, table, code))
+            op.execute("CREATE TRIGGER %s_search_update AFTER UPDATE OF name ON %s BEGIN "
+                       "UPDATE search_index SET name = new.name WHERE rowid = new.id * 4 + %d; END" % (table, table, code))
+            op.execute("CREATE TRIGGER %s_search_delete AFTER DELETE ON %s BEGIN "
+                       "DELETE FROM search_index WHERE rowid = old.id * 4 + %d; END" % (table, table, code))
+            op.execute("INSERT INTO search_index (rowid, name) SELECT id * 4 + %d, name FROM %s" % (code, table))
+
+
+def downgrade():
+    dialect = op.get_bind().dialect.name
+    if dialect == 'postgresql':
+        for table in TABLES:
+            op.execute("DROP INDEX ix_%s_name_trgm" % table)
+            op.execute("DROP INDEX ix_%s_name_tsv" % table)
+    elif dialect == 'sqlite':
+        for table in TABLES:
+            for event in ('insert', 'update', 'delete'):
+                op.execute("DROP TRIGGER %s_search_%s" % (table, event))
+        op.execute("DROP TABLE search_index")
+
+    for table in TABLES:
+        op.drop_index('ix_%s_name_lower' % table, table_name=table)
@@ -0,0 +1,29 @@
+"""users.favorites_version, the version favorites_cache keys each user's set on
+
+Revision ID: f3a8c1d5e6b2
+Revises: b6f1d2e8c475
+Create Date: 2026-10-18 14:02:31.518204
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3a8c1d5e6b2'
+down_revision = 'b6f1d2e8c475'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('users', sa.Column('favorites_version', sa.BigInteger(), server_default='0', nullable=False))
+    # sets cached before this were keyed on the favorites table version
+    op.execute(
+        "UPDATE users SET favorites_version = COALESCE("
+        "(SELECT version FROM table_versions WHERE table_name = 'favorites'), 0)"
+    )
+
+
+def downgrade():
+    op.drop_column('users', 'favorites_version')
@@ -2,29 +2,43 @@
 This module takes care of starting the API Server, Loading the DB and Adding the endpoints
 """
 import os
-from flask import Flask, request, jsonify, url_for
+from flask import Flask, request, jsonify, url_for, stream_with_context
 from flask_migrate import Migrate
 from flask_swagger import swagger
 from flask_cors import CORS
-from utils import APIException, generate_sitemap
+from utils import APIException, generate_sitemap, paginate, split_page, page_headers, sort_order
 from admin import setup_admin
-from models import db, Users, Favorites, People, Planets, Species, Vehicles
+from database import setup_database, pool_metrics, use_primary
+from commands import setup_commands
+from models import db, Users, Favorites, People, Planets, Species, Vehicles, FAVORITE_MODELS, change_favorite_count
+from projections import projection_query, project_rows, project_item, parse_fields, parse_embed, serialize_users
+from schemas import check_input
+from cache import response_cache, cached
+from versions import conditional
+from streaming import wants_stream, stream_rows
+from export import export_chunks, EXPORT_TABLES, EXPORT_FORMATS
+from bulk import read_items, bulk_save
+from search import search, exclude_search_tables, SEARCH_TYPES, MAX_SEARCH_OFFSET
+from filters import filter_rows, parse_sort
+from favorites_cache import favorites_cache, user_favorites
+from favorites import add_favorite, add_failure, remove_favorite, change_favorites, read_batch
+from metrics import setup_metrics, render_metrics
+from json_provider import setup_json
 from sqlalchemy import select
 
 app = Flask(__name__)
 app.url_map.strict_slashes = False
+setup_json(app)
 
-db_url = os.getenv("DATABASE_URL")
-if db_url is not None:
-    app.config['SQLALCHEMY_DATABASE_URI'] = db_url.replace("postgres://", "postgresql://")
-else:
-    app.config['SQLALCHEMY_DATABASE_URI'] = "sqlite:////tmp/test.db"
+setup_database(app)
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 
-MIGRATE = Migrate(app, db)
+MIGRATE = Migrate(app, db, include_object=exclude_search_tables)
 db.init_app(app)
-CORS(app)
+CORS(app, expose_headers=["X-Next-Cursor", "X-Next-Offset", "ETag", "Server-Timing"])
 setup_admin(app)
+setup_commands(app)
+setup_metrics(app)
 
 # Handle/serialize errors like a JSON object
 @app.errorhandler(APIException)
@@ -36,282 +50,220 @@ def handle_invalid_usage(error):
 def sitemap():
     return generate_sitemap(app)
 
+@app.route("/cache/stats", methods=["GET"])
+def get_cache_stats():
+    return jsonify(dict(response_cache.stats(), favorites=favorites_cache.stats())), 200
+
+@app.route("/pool/stats", methods=["GET"])
+def get_pool_stats():
+    stats = pool_metrics.stats()
+    stats["status"] = db.engine.pool.status()
+    return jsonify(stats), 200
+
+@app.route("/metrics", methods=["GET"])
+def get_metrics():
+    stats = render_metrics(response_cache.stats(), pool_metrics.stats())
+    return stats, 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8"}
+
 @app.route('/users', methods=['GET'])
+@conditional("users", "favorites")
 def get_users():
-    users = db.session.execute(select(Users)).scalars().all()
-    return jsonify([obj.serialize() for obj in users]), 200
+    fields = parse_fields(Users, request.args)
+    embed = parse_embed(Users, request.args)
+    stmt, limit = paginate(select(Users).options(*Users.loader_options(fields)), Users, request.args)
+    users, next_cursor = split_page(db.session.execute(stmt).scalars().all(), limit)
+    return jsonify(serialize_users(users, fields, embed)), 200, page_headers(next_cursor)
 
 @app.route("/users/<int:id>", methods=["GET"])
+@conditional("users", "favorites")
 def get_user(id):
-    stmt = select(Users).where(Users.id == id)
+    fields = parse_fields(Users, request.args)
+    embed = parse_embed(Users, request.args)
+    stmt = select(Users).options(*Users.loader_options(fields)).where(Users.id == id)
     user = db.session.execute(stmt).scalar_one_or_none()
     if user is None:
         return jsonify({"error": "User not found"}), 404
-    return jsonify(user.serialize()), 200
+    return jsonify(serialize_users([user], fields, embed)[0]), 200
 
 @app.route("/users", methods=["POST"])
 def create_user():
     data = request.get_json()
     if not data  or "name" not in data or "email" not in data or "password" not in data or "is_active" not in data:
         return jsonify({"error": "Missing data"}), 400
-    new_user = Users(
-        name=data["name"],
-        email=data["email"],
-        password=data["password"],
-        is_active=data["is_active"],
-    )
+    new_user = Users(**check_input(Users, data))
     db.session.add(new_user)
     db.session.commit()
-    return jsonify(new_user.serialize()), 201
+    return jsonify(new_user.serialize(favorite_count=0)), 201
 
 
 @app.route("/users/<int:id>", methods=["PUT"])
 def update_user(id):
-    data = request.get_json()
-    stmt = select(Users).where(Users.id == id)
+    stmt = select(Users).options(*Users.loader_options()).where(Users.id == id)
     user = db.session.execute(stmt).scalar_one_or_none()
     if user is None:
         return jsonify({"error": "User not found"}), 404
-    user.email = data.get("email", user.email) 
-    user.password = data.get("password", user.password)
-    user.is_active = data.get("is_active", user.is_active)
+    for key, value in check_input(Users, request.get_json(), id).items():
+        setattr(user, key, value)
     db.session.commit()
-    return jsonify(user.serialize()), 200
+    return jsonify(serialize_users([user])[0]), 200
 
 @app.route("/users/<int:id>", methods=["DELETE"])
 def delete_user(id):
-    stmt = select(Users).where(Users.id == id)
+    stmt = select(Users).options(*Users.loader_options()).where(Users.id == id)
     user = db.session.execute(stmt).scalar_one_or_none()
     if user is None:
         return jsonify({"error": "User not found"}), 404
+    favorited = {}
+    for favorite in user.favorites:
+        favorited.setdefault(favorite.item_type, []).append(favorite.item_id)
     db.session.delete(user)
+    for item_type, item_ids in favorited.items():
+        change_favorite_count(item_type, item_ids, -1)
     db.session.commit()
+    # the cascade removed this user's favorites, so favorited_by changed everywhere
+    response_cache.clear()
+    favorites_cache.discard(id)
     return jsonify({"message": "User deleted"}), 200
 
 @app.route("/users/favorites", methods=["GET"])
+@use_primary # read-your-writes right after POST /favorite/...
+@conditional("favorites")
 def get_user_favorites():
     current_user_id = 1 #to update later with authentication
-    stmt = select(Favorites).where(Favorites.user_id == current_user_id)
-    favorites = db.session.execute(stmt).scalars().all()
-    if favorites is None:
-        return jsonify({"error": "Favorites not found"}), 404
-    return jsonify([fav.serialize() for fav in favorites]), 200
-
-@app.route("/favorite/people/<int:id>", methods=["POST"])
-def create_fav_person(id):
-    current_user_id = 1 #to update later with authentication
-    user = db.session.get(Users, current_user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    person = db.session.get(People, id)
-    if not person:
-        return jsonify({"error": "Person not found"}), 404
-    existing_fav = db.session.execute(
-        db.select(Favorites).where(
-            Favorites.user_id == current_user_id,
-            Favorites.item_id == person.id,
-            Favorites.item_type == "people"
-        )
-    ).scalars().first()
-    if existing_fav:
-        return jsonify({"error": "Person already in favorites"}), 400
-    new_fav_person = Favorites(
-        user_id=current_user_id,
-        item_id=person.id,
-        item_type="person",
-        item_name=person.name
-    )
-    db.session.add(new_fav_person)
-    db.session.commit()
-    return jsonify(new_fav_person.serialize()), 201
-
-@app.route("/favorite/planet/<int:id>", methods=["POST"])
-def create_fav_planet(id):
-    current_user_id = 1 #to update later with authentication
-    user = db.session.get(Users, current_user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    planet = db.session.get(Planets, id)
-    if not planet:
-        return jsonify({"error": "Planet not found"}), 404
-    existing_fav = db.session.execute(
-        db.select(Favorites).where(
-            Favorites.user_id == current_user_id,
-            Favorites.item_id == planet.id,
-            Favorites.item_type == "planet"
-        )
-    ).scalars().first()
-    if existing_fav:
-        return jsonify({"error": "Planet already in favorites"}), 400
-    new_fav_planet = Favorites(
-        user_id=current_user_id,
-        item_id=planet.id,
-        item_type="planet",
-        item_name=planet.name
-    )
-    db.session.add(new_fav_planet)
-    db.session.commit()
-    return jsonify(new_fav_planet.serialize()), 201
-
-@app.route("/favorite/species/<int:id>", methods=["POST"])
-def create_fav_species(id):
+    return jsonify(user_favorites([current_user_id])[current_user_id]), 200
+
+@app.route("/favorites/top", methods=["GET"])
+@conditional("people", "planets", "species", "vehicles")
+def get_top_favorites():
+    model = FAVORITE_MODELS.get(request.args.get("type"))
+    if model is None:
+        return jsonify({"error": "type must be one of " + ", ".join(FAVORITE_MODELS)}), 400
+    try:
+        limit = min(int(request.args.get("limit", 10)), 100)
+    except ValueError:
+        return jsonify({"error": "limit must be an integer"}), 400
+    if limit < 1:
+        return jsonify({"error": "limit must be greater than 0"}), 400
+    stmt = select(model.id, model.name, model.favorite_count).where(
+        model.favorite_count > 0
+    ).order_by(model.favorite_count.desc(), model.id).limit(limit)
+    return jsonify([dict(row._mapping) for row in db.session.execute(stmt)]), 200
+
+@app.route("/favorite/people/<int:id>", methods=["POST"], defaults={"item_type": "person"})
+@app.route("/favorite/planet/<int:id>", methods=["POST"], defaults={"item_type": "planet"})
+@app.route("/favorite/species/<int:id>", methods=["POST"], defaults={"item_type": "species"})
+@app.route("/favorite/vehicle/<int:id>", methods=["POST"], defaults={"item_type": "vehicle"})
+def create_favorite(id, item_type):
     current_user_id = 1 #to update later with authentication
-    user = db.session.get(Users, current_user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    species = db.session.get(Species, id)
-    if not species:
-        return jsonify({"error": "Species not found"}), 404
-    existing_fav = db.session.execute(
-        db.select(Favorites).where(
-            Favorites.user_id == current_user_id,
-            Favorites.item_id == species.id,
-            Favorites.item_type == "species"
-        )
-    ).scalars().first()
-    if existing_fav:
-        return jsonify({"error": "Species already in favorites"}), 400
-    new_fav_species = Favorites(
-        user_id=current_user_id,
-        item_id=species.id,
-        item_type="species",
-        item_name=species.name
-    )
-    db.session.add(new_fav_species)
-    db.session.commit()
-    return jsonify(new_fav_species.serialize()), 201
-
-@app.route("/favorite/vehicle/<int:id>", methods=["POST"])
-def create_fav_vehicle(id):
+    favorite = add_favorite(current_user_id, item_type, id)
+    if favorite is None:
+        message, status = add_failure(current_user_id, item_type, id)
+        return jsonify({"error": message}), status
+    return jsonify(favorite), 201
+
+@app.route("/favorites/batch", methods=["POST"])
+def batch_favorites():
     current_user_id = 1 #to update later with authentication
-    user = db.session.get(Users, current_user_id)
-    if not user:
-        return jsonify({"error": "User not found"}), 404
-    vehicle = db.session.get(Vehicles, id)
-    if not vehicle:
-        return jsonify({"error": "Vehicle not found"}), 404
-    existing_fav = db.session.execute(
-        db.select(Favorites).where(
-            Favorites.user_id == current_user_id,
-            Favorites.item_id == vehicle.id,
-            Favorites.item_type == "vehicle"
-        )
-    ).scalars().first()
-    if existing_fav:
-        return jsonify({"error": "Vehicle already in favorites"}), 400
-    new_fav_vehicle = Favorites(
-        user_id=current_user_id,
-        item_id=vehicle.id,
-        item_type="vehicle",
-        item_name=vehicle.name
-    )
-    db.session.add(new_fav_vehicle)
-    db.session.commit()
-    return jsonify(new_fav_vehicle.serialize()), 201
+    add, remove = read_batch(request.get_json(silent=True))
+    added, removed = change_favorites(current_user_id, add, remove)
+    return jsonify({"added": added, "removed": removed}), 200
 
 @app.route("/people", methods=["POST"])
 def create_person():
     data = request.get_json()
     if not data or "name" not in data:
         return jsonify({"error": "Missing data"}), 400
-    new_person = People(
-        name=data["name"],
-    )
+    new_person = People(**check_input(People, data))
     db.session.add(new_person)
     db.session.commit()
-    return jsonify(new_person.serialize()), 201
+    response_cache.invalidate_entity("people", new_person.id)
+    return jsonify(project_item(People, new_person.id)), 201
 
 @app.route("/planets", methods=["POST"])
 def create_planet():
     data = request.get_json()
     if not data  or "name" not in data:
         return jsonify({"error": "Missing data"}), 400
-    new_planet = Planets(
-        name=data["name"],
-    )
+    new_planet = Planets(**check_input(Planets, data))
     db.session.add(new_planet)
     db.session.commit()
-    return jsonify(new_planet.serialize()), 201
+    response_cache.invalidate_entity("planets", new_planet.id)
+    return jsonify(project_item(Planets, new_planet.id)), 201
 
 @app.route("/species", methods=["POST"])
 def create_species():
     data = request.get_json()
     if not data  or "name" not in data:
         return jsonify({"error": "Missing data"}), 400
-    new_species = Species(
-        name=data["name"],
-    )
+    new_species = Species(**check_input(Species, data))
     db.session.add(new_species)
     db.session.commit()
-    return jsonify(new_species.serialize()), 201
+    response_cache.invalidate_entity("species", new_species.id)
+    return jsonify(project_item(Species, new_species.id)), 201
 
 @app.route("/vehicles", methods=["POST"])
 def create_vehicle():
     data = request.get_json()
     if not data  or "name" not in data:
         return jsonify({"error": "Missing data"}), 400
-    new_vehicle = Vehicles(
-        name=data["name"],
-    )
+    new_vehicle = Vehicles(**check_input(Vehicles, data))
     db.session.add(new_vehicle)
     db.session.commit()
-    return jsonify(new_vehicle.serialize()), 201
+    response_cache.invalidate_entity("vehicles", new_vehicle.id)
+    return jsonify(project_item(Vehicles, new_vehicle.id)), 201
+
+@app.route("/people/bulk", methods=["POST"])
+def bulk_people():
+    results = bulk_save(People, read_items())
+    response_cache.invalidate_entity("people")
+    return jsonify({"results": results}), 200
+
+@app.route("/planets/bulk", methods=["POST"])
+def bulk_planets():
+    results = bulk_save(Planets, read_items())
+    response_cache.invalidate_entity("planets")
+    return jsonify({"results": results}), 200
+
+@app.route("/species/bulk", methods=["POST"])
+def bulk_species():
+    results = bulk_save(Species, read_items())
+    response_cache.invalidate_entity("species")
+    return jsonify({"results": results}), 200
+
+@app.route("/vehicles/bulk", methods=["POST"])
+def bulk_vehicles():
+    results = bulk_save(Vehicles, read_items())
+    response_cache.invalidate_entity("vehicles")
+    return jsonify({"results": results}), 200
 
 @app.route("/people/<int:id>", methods=["PUT"])
 def update_person(id):
-    data = request.get_json()
-    stmt = select(People).where(People.id == id)
-    person = db.session.execute(stmt).scalar_one_or_none()
+    person = db.session.get(People, id)
     if person is None:
         return jsonify({"error": "Person not found"}), 404
-    person.eye_color = data.get("eye_color", person.eye_color) 
-    person.gender = data.get("gender", person.gender)
-    person.hair_color = data.get("hair_color", person.hair_color)
-    person.height = data.get("height", person.height)
-    person.mass = data.get("mass", person.mass)
-    person.name = data.get("name", person.name)
-    person.skin_color = data.get("skin_color", person.skin_color)
-
-    species_id = data.get("species_id")
-    if species_id is not None:
-        species = db.session.get(Species, species_id)
-        if not species:
-            return jsonify({"error": "Invalid species_id"}), 400
-        person.species = species
-
-    homeworld_id = data.get("homeworld_id")
-    if homeworld_id is not None:
-        homeworld = db.session.get(Planets, homeworld_id)
-        if not homeworld:
-            return jsonify({"error": "Invalid homeworld_id"}), 400
-        person.homeworld = homeworld
-
+    for key, value in check_input(People, request.get_json(), id).items():
+        setattr(person, key, value)
     db.session.commit()
-    return jsonify(person.serialize()), 200
+    response_cache.invalidate_entity("people", id)
+    return jsonify(project_item(People, id)), 200
 
 @app.route("/planets/<int:id>", methods=["PUT"])
 def update_planet(id):
-    data = request.get_json()
-    stmt = select(Planets).where(Planets.id == id)
-    planet = db.session.execute(stmt).scalar_one_or_none()
+    planet = db.session.get(Planets, id)
     if planet is None:
         return jsonify({"error": "Planet not found"}), 404
-    planet.climate = data.get("climate", planet.climate) 
-    planet.diameter = data.get("diameter", planet.diameter)
-    planet.gravity = data.get("gravity", planet.gravity)
-    planet.name = data.get("name", planet.name)
-    planet.orbital_period = data.get("orbital_period", planet.orbital_period)
-    planet.population = data.get("population", planet.population)
-    planet.surface_water = data.get("surface_water", planet.surface_water)
-
-    fauna_ids = data.get("fauna_ids")
+    values = check_input(Planets, request.get_json(), id)
+    fauna_ids = values.pop("fauna_ids", None)
+    residents_ids = values.pop("residents_ids", None)
+    for key, value in values.items():
+        setattr(planet, key, value)
+
     if fauna_ids is not None:
         species_list = db.session.query(Species).filter(Species.id.in_(fauna_ids)).all()
         if len(species_list) != len(fauna_ids):
             return jsonify({"error": "One or more fauna species not found"}), 400
         planet.fauna = species_list
 
-    residents_ids = data.get("residents_ids")
     if residents_ids is not None:
         people =  db.session.query(People).filter(People.id.in_(residents_ids)).all()
         if len(people) != len(residents_ids):
@@ -319,59 +271,44 @@ def update_planet(id):
         planet.residents = people
 
     db.session.commit()
-    return jsonify(planet.serialize()), 200
+    response_cache.invalidate_entity("planets", id)
+    if fauna_ids is not None or residents_ids is not None:
+        # moved residents/fauna left other planets too
+        response_cache.invalidate("planets")
+    return jsonify(project_item(Planets, id)), 200
 
 @app.route("/species/<int:id>", methods=["PUT"])
 def update_species(id):
-    data = request.get_json()
-    stmt = select(Species).where(Species.id == id)
-    species = db.session.execute(stmt).scalar_one_or_none()
+    species = db.session.get(Species, id)
     if species is None:
         return jsonify({"error": "Species not found"}), 404
-    species.average_height = data.get("average_height", species.average_height) 
-    species.average_lifespan = data.get("average_lifespan", species.average_lifespan)
-    species.classification = data.get("classification", species.classification)
-    species.designation = data.get("designation", species.designation)
-    species.eye_colors = data.get("eye_colors", species.eye_colors)
-    species.hair_colors = data.get("hair_colors", species.hair_colors)
-    species.language = data.get("language", species.language)
-    species.name = data.get("name", species.name)
-    species.skin_colors = data.get("skin_colors", species.skin_colors)
-
-    homeworld_id = data.get("homeworld_id")
-    if homeworld_id is not None:
-        homeworld = db.session.get(Planets, homeworld_id)
-        if not homeworld:
-            return jsonify({"error": "Invalid homeworld_id"}), 400
-        species.homeworld = homeworld
-
-    members_ids = data.get("members_ids")
+    values = check_input(Species, request.get_json(), id)
+    members_ids = values.pop("members_ids", None)
+    for key, value in values.items():
+        setattr(species, key, value)
+
     if members_ids is not None:
         people =  db.session.query(People).filter(People.id.in_(members_ids)).all()
-        if len(people) != len(residents_ids):
+        if len(people) != len(members_ids):
             return jsonify({"error": "One or more members not found"}), 400
         species.members = people
 
     db.session.commit()
-    return jsonify(species.serialize()), 200
+    response_cache.invalidate_entity("species", id)
+    if members_ids is not None:
+        response_cache.invalidate("species")
+    return jsonify(project_item(Species, id)), 200
 
 @app.route("/vehicles/<int:id>", methods=["PUT"])
 def update_vehicle(id):
-    data = request.get_json()
-    stmt = select(Vehicles).where(Vehicles.id == id)
-    vehicle = db.session.execute(stmt).scalar_one_or_none()
+    vehicle = db.session.get(Vehicles, id)
     if vehicle is None:
         return jsonify({"error": "Vehicle not found"}), 404
-    vehicle.cargo_capacity = data.get("cargo_capacity", vehicle.cargo_capacity) 
-    vehicle.consumables = data.get("consumables", vehicle.consumables)
-    vehicle.crew = data.get("crew", vehicle.crew)
-    vehicle.length = data.get("length", vehicle.length)
-    vehicle.max_atmosphering_speed = data.get("max_atmosphering_speed", vehicle.max_atmosphering_speed)
-    vehicle.model = data.get("model", vehicle.model)
-    vehicle.name = data.get("name", vehicle.name)
-    vehicle.vehicle_class = data.get("vehicle_class", vehicle.vehicle_class)
+    for key, value in check_input(Vehicles, request.get_json(), id).items():
+        setattr(vehicle, key, value)
     db.session.commit()
-    return jsonify(vehicle.serialize()), 200
+    response_cache.invalidate_entity("vehicles", id)
+    return jsonify(project_item(Vehicles, id)), 200
 
 @app.route("/favorites/<int:id>", methods=["DELETE"])
 def delete_fav(id):
@@ -383,121 +320,147 @@ def delete_fav(id):
     fav = db.session.execute(stmt).scalar_one_or_none()
     if fav is None:
         return jsonify({"error": "Favorite not found"}), 404
-    db.session.delete(fav)
-    db.session.commit()
+    remove_favorite(current_user_id, fav.item_type, fav.item_id)
     return jsonify({"message": "Favorite deleted"}), 200
 
-@app.route("/favorite/people/<int:id>", methods=["DELETE"])
-def delete_fav_person(id):
+@app.route("/favorite/people/<int:id>", methods=["DELETE"], defaults={"item_type": "person"})
+@app.route("/favorite/planet/<int:id>", methods=["DELETE"], defaults={"item_type": "planet"})
+@app.route("/favorite/species/<int:id>", methods=["DELETE"], defaults={"item_type": "species"})
+@app.route("/favorite/vehicle/<int:id>", methods=["DELETE"], defaults={"item_type": "vehicle"})
+def delete_favorite(id, item_type):
     current_user_id = 1 #to update later with authentication
-    stmt = select(Favorites).where(
-        Favorites.user_id == current_user_id,
-        Favorites.item_type == "person",
-        Favorites.item_id == id
-        )
-    fav_person = db.session.execute(stmt).scalar_one_or_none()
-    if fav_person is None:
-        return jsonify({"error": "Favorite person not found"}), 404
-    db.session.delete(fav_person)
-    db.session.commit()
-    return jsonify({"message": "Favorite person deleted"}), 200
-
-@app.route("/favorite/planet/<int:id>", methods=["DELETE"])
-def delete_fav_planet(id):
-    current_user_id = 1 #to update later with authentication
-    stmt = select(Favorites).where(
-        Favorites.user_id == current_user_id,
-        Favorites.item_type == "planet",
-        Favorites.item_id == id
-        )
-    fav_planet = db.session.execute(stmt).scalar_one_or_none()
-    if fav_planet is None:
-        return jsonify({"error": "Favorite planet not found"}), 404
-    db.session.delete(fav_planet)
-    db.session.commit()
-    return jsonify({"message": "Favorite planet deleted"}), 200
-
-@app.route("/favorite/species/<int:id>", methods=["DELETE"])
-def delete_fav_species(id):
-    current_user_id = 1 #to update later with authentication
-    stmt = select(Favorites).where(
-        Favorites.user_id == current_user_id,
-        Favorites.item_type == "species",
-        Favorites.item_id == id
-        )
-    fav_species = db.session.execute(stmt).scalar_one_or_none()
-    if fav_species is None:
-        return jsonify({"error": "Favorite species not found"}), 404
-    db.session.delete(fav_species)
-    db.session.commit()
-    return jsonify({"message": "Favorite species deleted"}), 200
-
-@app.route("/favorite/vehicle/<int:id>", methods=["DELETE"])
-def delete_fav_vehicle(id):
-    current_user_id = 1 #to update later with authentication
-    stmt = select(Favorites).where(
-        Favorites.user_id == current_user_id,
-        Favorites.item_type == "vehicle",
-        Favorites.item_id == id
-        )
-    fav_vehicle = db.session.execute(stmt).scalar_one_or_none()
-    if fav_vehicle is None:
-        return jsonify({"error": "Favorite vehicle not found"}), 404
-    db.session.delete(fav_vehicle)
-    db.session.commit()
-    return jsonify({"message": "Favorite vehicle deleted"}), 200
+    if remove_favorite(current_user_id, item_type, id) is None:
+        return jsonify({"error": "Favorite %s not found" % item_type}), 404
+    return jsonify({"message": "Favorite %s deleted" % item_type}), 200
 
 @app.route('/people', methods=['GET'])
+@conditional("people", "species", "planets", "favorites", "users")
+@cached("people")
 def get_people():
-    people = db.session.execute(select(People)).scalars().all()
-    return jsonify([obj.serialize() for obj in people]), 200
+    fields = parse_fields(People, request.args)
+    sort = parse_sort(People, request.args)
+    stmt = filter_rows(projection_query(People, fields, sort), People, request.args)
+    if wants_stream():
+        return stream_rows(People, stmt.order_by(*sort_order(People, sort)), fields)
+    stmt, limit = paginate(stmt, People, request.args, sort)
+    rows, next_cursor = split_page(db.session.execute(stmt).all(), limit, sort)
+    return jsonify(project_rows(People, rows, fields)), 200, page_headers(next_cursor)
 
 @app.route("/people/<int:id>", methods=["GET"])
+@conditional("people", "species", "planets", "favorites", "users")
+@cached("people")
 def get_person(id):
-    stmt = select(People).where(People.id == id)
-    person = db.session.execute(stmt).scalar_one_or_none()
-    if person is None:
+    item = project_item(People, id, parse_fields(People, request.args))
+    if item is None:
         return jsonify({"error": "Person not found"}), 404
-    return jsonify(person.serialize()), 200
+    return jsonify(item), 200
 
 @app.route('/planets', methods=['GET'])
+@conditional("planets", "people", "species", "favorites", "users")
+@cached("planets")
 def get_planets():
-    planets = db.session.execute(select(Planets)).scalars().all()
-    return jsonify([obj.serialize() for obj in planets]), 200
+    fields = parse_fields(Planets, request.args)
+    sort = parse_sort(Planets, request.args)
+    stmt = filter_rows(projection_query(Planets, fields, sort), Planets, request.args)
+    if wants_stream():
+        return stream_rows(Planets, stmt.order_by(*sort_order(Planets, sort)), fields)
+    stmt, limit = paginate(stmt, Planets, request.args, sort)
+    rows, next_cursor = split_page(db.session.execute(stmt).all(), limit, sort)
+    return jsonify(project_rows(Planets, rows, fields)), 200, page_headers(next_cursor)
 
 @app.route("/planets/<int:id>", methods=["GET"])
+@conditional("planets", "people", "species", "favorites", "users")
+@cached("planets")
 def get_planet(id):
-    stmt = select(Planets).where(Planets.id == id)
-    planet = db.session.execute(stmt).scalar_one_or_none()
-    if planet is None:
+    item = project_item(Planets, id, parse_fields(Planets, request.args))
+    if item is None:
         return jsonify({"error": "Planet not found"}), 404
-    return jsonify(planet.serialize()), 200
+    return jsonify(item), 200
 
 @app.route('/species', methods=['GET'])
+@conditional("species", "people", "planets", "favorites", "users")
+@cached("species")
 def get_all_species():
-    species = db.session.execute(select(Species)).scalars().all()
-    return jsonify([obj.serialize() for obj in species]), 200
+    fields = parse_fields(Species, request.args)
+    sort = parse_sort(Species, request.args)
+    stmt = filter_rows(projection_query(Species, fields, sort), Species, request.args)
+    if wants_stream():
+        return stream_rows(Species, stmt.order_by(*sort_order(Species, sort)), fields)
+    stmt, limit = paginate(stmt, Species, request.args, sort)
+    rows, next_cursor = split_page(db.session.execute(stmt).all(), limit, sort)
+    return jsonify(project_rows(Species, rows, fields)), 200, page_headers(next_cursor)
 
 @app.route("/species/<int:id>", methods=["GET"])
+@conditional("species", "people", "planets", "favorites", "users")
+@cached("species")
 def get_species(id):
-    stmt = select(Species).where(Species.id == id)
-    species = db.session.execute(stmt).scalar_one_or_none()
-    if species is None:
+    item = project_item(Species, id, parse_fields(Species, request.args))
+    if item is None:
         return jsonify({"error": "Species not found"}), 404
-    return jsonify(species.serialize()), 200
+    return jsonify(item), 200
 
 @app.route('/vehicles', methods=['GET'])
+@conditional("vehicles", "favorites", "users")
+@cached("vehicles")
 def get_vehicles():
-    vehicles = db.session.execute(select(Vehicles)).scalars().all()
-    return jsonify([obj.serialize() for obj in vehicles]), 200
+    fields = parse_fields(Vehicles, request.args)
+    sort = parse_sort(Vehicles, request.args)
+    stmt = filter_rows(projection_query(Vehicles, fields, sort), Vehicles, request.args)
+    if wants_stream():
+        return stream_rows(Vehicles, stmt.order_by(*sort_order(Vehicles, sort)), fields)
+    stmt, limit = paginate(stmt, Vehicles, request.args, sort)
+    rows, next_cursor = split_page(db.session.execute(stmt).all(), limit, sort)
+    return jsonify(project_rows(Vehicles, rows, fields)), 200, page_headers(next_cursor)
 
 @app.route("/vehicles/<int:id>", methods=["GET"])
+@conditional("vehicles", "favorites", "users")
+@cached("vehicles")
 def get_vehicle(id):
-    stmt = select(Vehicles).where(Vehicles.id == id)
-    vehicle = db.session.execute(stmt).scalar_one_or_none()
-    if vehicle is None:
+    item = project_item(Vehicles, id, parse_fields(Vehicles, request.args))
+    if item is None:
         return jsonify({"error": "Vehicle not found"}), 404
-    return jsonify(vehicle.serialize()), 200
+    return jsonify(item), 200
+
+@app.route("/search", methods=["GET"])
+@conditional("people", "planets", "species", "vehicles")
+def search_names():
+    q = request.args.get("q", "").strip()
+    if not q:
+        return jsonify({"error": "Missing q"}), 400
+    types = request.args.get("type", ",".join(SEARCH_TYPES)).split(",")
+    if not set(types) <= set(SEARCH_TYPES):
+        return jsonify({"error": "type must be one of " + ", ".join(SEARCH_TYPES)}), 400
+    try:
+        limit = min(int(request.args.get("limit", 20)), 100)
+        offset = int(request.args.get("offset", 0))
+    except ValueError:
+        return jsonify({"error": "limit and offset must be integers"}), 400
+    if limit < 1 or not 0 <= offset <= MAX_SEARCH_OFFSET:
+        return jsonify({"error": "limit must be positive and offset at most %d" % MAX_SEARCH_OFFSET}), 400
+    results = search(q, types, limit + 1, offset)
+    headers = {"X-Next-Offset": str(offset + limit)} if len(results) > limit else {}
+    return jsonify(results[:limit]), 200, headers
+
+@app.route("/export/<table>", methods=["GET"])
+def export_table(table):
+    if table not in EXPORT_TABLES:
+        return jsonify({"error": "table must be one of " + ", ".join(EXPORT_TABLES)}), 404
+    format = request.args.get("format", "ndjson")
+    if format not in EXPORT_FORMATS:
+        return jsonify({"error": "format must be one of " + ", ".join(EXPORT_FORMATS)}), 400
+    # ?gzip=1 downloads a .gz file; Accept-Encoding: gzip compresses the transfer only
+    download = request.args.get("gzip") in ("1", "true")
+    transfer = not download and "gzip" in request.accept_encodings
+    filename = "%s.%s" % (table, format) + (".gz" if download else "")
+    response = app.response_class(
+        stream_with_context(export_chunks(table, format, compress=download or transfer)),
+        mimetype="application/gzip" if download else EXPORT_FORMATS[format],
+        headers={"Content-Disposition": "attachment; filename=" + filename}
+    )
+    if transfer:
+        response.headers["Content-Encoding"] = "gzip"
+    response.vary.add("Accept-Encoding")
+    return response
 
 # this only runs if `$ python src/app.py` is executed
 if __name__ == '__main__':
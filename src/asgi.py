@@ -0,0 +1,105 @@
+"""
+Async serving mode for the read paths, next to wsgi.py:
+
+    uvicorn asgi:application --app-dir src
+
+Views run on an AsyncSession (aiosqlite locally, asyncpg on PostgreSQL),
+so a worker keeps serving other requests while one waits on the database.
+The query building and row shaping are the same functions the Flask views
+use (run through AsyncSession.run_sync), so the JSON is identical.
+"""
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from starlette.applications import Starlette
+from starlette.responses import Response
+from starlette.routing import Route
+from database import async_database_url, async_engine_options, database_url, database_read_url
+from filters import filter_rows, parse_sort
+from json_provider import json_provider_class
+from favorites_cache import user_favorites
+from models import Users, People, Planets, Species, Vehicles
+from projections import parse_embed, parse_fields, projection_query, project_rows, serialize_users
+from utils import APIException, paginate, split_page, page_headers
+
+# this app only serves reads, so it goes to the replica when there is one
+read_url = database_read_url() or database_url()
+# favorites read from a replica may lag behind the primary's version, keep them out of the cache
+store_favorites = database_read_url() is None
+engine = create_async_engine(async_database_url(read_url), **async_engine_options(read_url))
+Session = async_sessionmaker(engine, expire_on_commit=False)
+
+def json_response(data, status_code=200, headers=None):
+    # byte for byte what flask.jsonify produces, with the same encoder
+    body = json_encoder.dumps(data, separators=(",", ":")) + "\n"
+    return Response(body, status_code=status_code, headers=headers, media_type="application/json")
+
+def list_view(model):
+    async def view(request):
+        fields = parse_fields(model, request.query_params)
+        sort = parse_sort(model, request.query_params)
+        stmt = filter_rows(projection_query(model, fields, sort), model, request.query_params, engine.dialect.name)
+        stmt, limit = paginate(stmt, model, request.query_params, sort)
+        async with Session() as session:
+            rows, next_cursor = split_page((await session.execute(stmt)).all(), limit, sort)
+            items = await session.run_sync(lambda sync_session: project_rows(model, rows, fields, sync_session))
+        return json_response(items, headers=page_headers(next_cursor))
+    return view
+
+def detail_view(model, label):
+    async def view(request):
+        fields = parse_fields(model, request.query_params)
+        stmt = projection_query(model, fields).where(model.id == request.path_params["id"])
+        async with Session() as session:
+            row = (await session.execute(stmt)).one_or_none()
+            if row is None:
+                return json_response({"error": "%s not found" % label}, 404)
+            items = await session.run_sync(lambda sync_session: project_rows(model, [row], fields, sync_session))
+        return json_response(items[0])
+    return view
+
+async def get_users(request):
+    fields = parse_fields(Users, request.query_params)
+    embed = parse_embed(Users, request.query_params)
+    stmt, limit = paginate(select(Users).options(*Users.loader_options(fields)), Users, request.query_params)
+    async with Session() as session:
+        users, next_cursor = split_page((await session.execute(stmt)).scalars().all(), limit)
+        items = await session.run_sync(lambda sync_session: serialize_users(users, fields, embed, sync_session, store_favorites))
+        return json_response(items, headers=page_headers(next_cursor))
+
+async def get_user(request):
+    fields = parse_fields(Users, request.query_params)
+    embed = parse_embed(Users, request.query_params)
+    stmt = select(Users).options(*Users.loader_options(fields)).where(Users.id == request.path_params["id"])
+    async with Session() as session:
+        user = (await session.execute(stmt)).scalar_one_or_none()
+        if user is None:
+            return json_response({"error": "User not found"}, 404)
+        items = await session.run_sync(lambda sync_session: serialize_users([user], fields, embed, sync_session, store_favorites))
+        return json_response(items[0])
+
+async def get_user_favorites(request):
+    current_user_id = 1 #to update later with authentication
+    async with Session() as session:
+        favorites = await session.run_sync(lambda sync_session: user_favorites([current_user_id], sync_session, store_favorites))
+        return json_response(favorites[current_user_id])
+
+async def handle_invalid_usage(request, error):
+    return json_response(error.to_dict(), error.status_code)
+
+routes = [
+    Route("/users", get_users),
+    Route("/users/favorites", get_user_favorites),
+    Route("/users/{id:int}", get_user),
+    Route("/people", list_view(People)),
+    Route("/people/{id:int}", detail_view(People, "Person")),
+    Route("/planets", list_view(Planets)),
+    Route("/planets/{id:int}", detail_view(Planets, "Planet")),
+    Route("/species", list_view(Species)),
+    Route("/species/{id:int}", detail_view(Species, "Species")),
+    Route("/vehicles", list_view(Vehicles)),
+    Route("/vehicles/{id:int}", detail_view(Vehicles, "Vehicle")),
+]
+
+application = Starlette(routes=routes, exception_handlers={APIException: handle_invalid_usage})
+# providers only need their app for response(), which this module never calls
+json_encoder = json_provider_class()(application)
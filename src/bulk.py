@@ -0,0 +1,67 @@
+"""
+Bulk create/update for the reference models.
+
+The whole payload is validated against the model's input schema (see
+schemas.py) before anything is written, and the writes go out as chunked
+executemany statements inside a single transaction.
+"""
+import json
+import os
+from flask import request
+from sqlalchemy import insert, update
+from models import db
+from schemas import input_schema, writable_columns
+from streaming import NDJSON
+from utils import APIException
+
+BULK_CHUNK_SIZE = int(os.getenv("BULK_CHUNK_SIZE", 500))
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 50000))
+
+def read_items():
+    if request.mimetype == NDJSON:
+        items = []
+        for number, line in enumerate(request.stream, start=1):
+            if line.strip():
+                try:
+                    items.append(json.loads(line))
+                except ValueError:
+                    raise APIException("Invalid JSON on line %d" % number)
+    else:
+        items = request.get_json(silent=True)
+        if not isinstance(items, list):
+            raise APIException("Expected a JSON array or an NDJSON body")
+    if not items:
+        raise APIException("No items to save")
+    if len(items) > BULK_MAX_ITEMS:
+        raise APIException("At most %d items per request" % BULK_MAX_ITEMS, status_code=413)
+    return items
+
+def chunks(rows):
+    for start in range(0, len(rows), BULK_CHUNK_SIZE):
+        yield rows[start:start + BULK_CHUNK_SIZE]
+
+def bulk_save(model, items):
+    errors = input_schema(model).validate(items)
+    if errors:
+        raise APIException("Invalid items", payload={"items": errors})
+    columns = writable_columns(model)
+    creates = [(index, item) for index, item in enumerate(items) if "id" not in item]
+    updates = [(index, item) for index, item in enumerate(items) if "id" in item]
+    results = [None] * len(items)
+    try:
+        create_rows = [{key: item.get(key) for key in columns} for _, item in creates]
+        created_ids = []
+        for chunk in chunks(create_rows):
+            # RETURNING alone promises no order; this one matches the ids to the items
+            created_ids.extend(db.session.scalars(insert(model).returning(model.id, sort_by_parameter_order=True), chunk))
+        for (index, _), item_id in zip(creates, created_ids):
+            results[index] = {"index": index, "id": item_id, "status": "created"}
+        for chunk in chunks([item for _, item in updates]):
+            db.session.execute(update(model), chunk)
+        for index, item in updates:
+            results[index] = {"index": index, "id": item["id"], "status": "updated"}
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    return results
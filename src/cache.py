@@ -0,0 +1,115 @@
+"""
+Bounded in-process LRU + TTL cache for rendered GET responses of the
+reference data (people, planets, species, vehicles).
+"""
+import os
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import current_app, g, make_response, request
+
+# resources whose responses embed names from the key resource,
+# e.g. renaming a person changes the residents of its planet
+EMBEDDED_IN = {
+    "people": ("planets", "species"),
+    "planets": ("people", "species"),
+    "species": ("people", "planets"),
+    "vehicles": (),
+}
+
+class ResponseCache:
+
+    def __init__(self, maxsize=1024, ttl=60):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.generations = {}
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def generation(self, resource):
+        return self.generations.get(resource, 0)
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self.entries[key]
+                    self.evictions += 1
+                self.misses += 1
+                return None
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, value, generation):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            # an invalidation landed while this response was being built
+            if generation != self.generation(key[0]):
+                return
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, resource, id=None):
+        # id=None drops the whole resource, otherwise that item and every list page
+        with self.lock:
+            self.generations[resource] = self.generation(resource) + 1
+            for key in [key for key in self.entries if key[0] == resource]:
+                if id is None or key[1] is None or key[1] == id:
+                    del self.entries[key]
+
+    def invalidate_entity(self, resource, id=None):
+        self.invalidate(resource, id)
+        for dependent in EMBEDDED_IN.get(resource, ()):
+            self.invalidate(dependent)
+
+    def clear(self):
+        with self.lock:
+            for resource in list(self.generations):
+                self.generations[resource] += 1
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+response_cache = ResponseCache(
+    maxsize=int(os.getenv("RESPONSE_CACHE_SIZE", 1024)),
+    ttl=float(os.getenv("RESPONSE_CACHE_TTL", 60)),
+)
+
+def cached(resource):
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            # the ETag pins the table versions, so writes committed by other
+            # workers change the key even though they can't invalidate this cache
+            key = (resource, kwargs.get("id"), request.query_string, request.headers.get("Accept"), g.get("etag"))
+            hit = response_cache.get(key)
+            if hit is not None:
+                body, headers = hit
+                return current_app.response_class(body, headers=headers, mimetype="application/json")
+            generation = response_cache.generation(resource)
+            response = make_response(view(**kwargs))
+            if response.status_code == 200 and not response.is_streamed:
+                headers = [(name, value) for name, value in response.headers if name not in ("Content-Type", "Content-Length")]
+                response_cache.set(key, (response.get_data(), headers), generation)
+            return response
+        return wrapper
+    return decorator
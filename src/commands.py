@@ -0,0 +1,163 @@
+"""
+Flask CLI commands (flask <group> <command>) for tasks that run outside
+the API but against the same database and configuration.
+"""
+import os
+import sqlite3
+import time
+import click
+from sqlalchemy import text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.engine import make_url
+from models import db, reconcile_favorite_counts, TableVersions
+from datagen import COLUMNS, generate, favorites_capacity
+from loading import load_rows
+from versions import bump_versions
+from favorites import reset_favorites_versions
+from favorites_cache import favorites_cache
+from export import export_chunks, EXPORT_TABLES, EXPORT_FORMATS
+from importing import Importer, DataImportError, import_files
+
+def recreate_tables():
+    # every table but table_versions: its counters go on rising, so no ETag or
+    # cached response from before the reload can match the new rows
+    tables = [table for table in db.metadata.sorted_tables if table.name != TableVersions.__tablename__]
+    db.metadata.drop_all(db.engine, tables=tables)
+    db.metadata.create_all(db.engine)
+    with db.engine.begin() as connection:
+        bump_versions(connection, [table.name for table in tables])
+
+def setup_commands(app):
+
+    @app.cli.group()
+    def replica():
+        """Read replica helpers."""
+
+    @replica.command("sync")
+    def replica_sync():
+        """Copy the primary SQLite file over the replica file (local testing only)."""
+        primary = make_url(app.config["SQLALCHEMY_DATABASE_URI"])
+        binds = app.config.get("SQLALCHEMY_BINDS", {})
+        if "replica" not in binds:
+            raise click.ClickException("DATABASE_READ_URL is not set")
+        replica_url = make_url(binds["replica"]["url"])
+        if primary.get_backend_name() != "sqlite" or replica_url.get_backend_name() != "sqlite":
+            raise click.ClickException("replica sync only works with two SQLite files")
+        source = sqlite3.connect(primary.database)
+        target = sqlite3.connect(replica_url.database)
+        with target:
+            source.backup(target)
+        source.close()
+        target.close()
+        click.echo("Copied %s -> %s (%d bytes)" % (
+            primary.database, replica_url.database, os.path.getsize(replica_url.database)))
+
+    @app.cli.group()
+    def favorites():
+        """Favorites maintenance."""
+
+    @favorites.command("reconcile")
+    def favorites_reconcile():
+        """Recount favorite_count from the favorites table and fix any drift."""
+        for item_type, fixed in reconcile_favorite_counts().items():
+            click.echo("%s: %d fixed" % (item_type, fixed))
+
+    @app.cli.group()
+    def data():
+        """Bulk data tools."""
+
+    @data.command("generate")
+    @click.option("--users", default=10000, show_default=True)
+    @click.option("--people", default=100000, show_default=True)
+    @click.option("--planets", default=10000, show_default=True)
+    @click.option("--species", default=1000, show_default=True)
+    @click.option("--vehicles", default=10000, show_default=True)
+    @click.option("--favorites", default=1000000, show_default=True)
+    @click.option("--seed", default=42, show_default=True, help="Same seed and counts, same rows.")
+    @click.confirmation_option(prompt="This drops and recreates every table. Continue?")
+    def data_generate(seed, **counts):
+        """Replace the database with synthetic data (COPY on PostgreSQL, executemany elsewhere)."""
+        item_counts = {"person": counts["people"], "planet": counts["planets"],
+                       "species": counts["species"], "vehicle": counts["vehicles"]}
+        if counts["favorites"] and (not counts["users"] or counts["favorites"] > favorites_capacity(counts["users"], item_counts)):
+            raise click.ClickException("Too many favorites for these users and items (each user favorites an item once)")
+        recreate_tables()
+        tables = db.metadata.tables
+        started = time.perf_counter()
+        for table_name, rows in generate(counts, seed):
+            table_started = time.perf_counter()
+            with db.engine.begin() as connection:
+                if connection.dialect.name == "sqlite":
+                    connection.exec_driver_sql("PRAGMA synchronous = OFF")
+                count = load_rows(connection, tables[table_name], COLUMNS[table_name], rows)
+                bump_versions(connection, [table_name])
+            elapsed = time.perf_counter() - table_started
+            click.echo("%-10s %10d rows %8.1fs %10.0f rows/s" % (table_name, count, elapsed, count / elapsed if elapsed else 0))
+        reconcile_favorite_counts()
+        with db.engine.begin() as connection:
+            reset_favorites_versions(connection)
+        # a shared (Redis) cache would still hold the old users' favorites
+        favorites_cache.clear()
+        with db.engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        click.echo("done in %.1fs" % (time.perf_counter() - started))
+
+    @data.command("export")
+    @click.argument("table", type=click.Choice(EXPORT_TABLES))
+    @click.option("--format", "format_", type=click.Choice(list(EXPORT_FORMATS)), default="ndjson", show_default=True)
+    @click.option("--gzip", "compress", is_flag=True, help="gzip the output.")
+    @click.option("--output", "-o", type=click.File("wb"), default="-", help="File to write; stdout by default.")
+    def data_export(table, format_, compress, output):
+        """Dump a table as NDJSON or CSV, holding one chunk of rows in memory at a time."""
+        started = time.perf_counter()
+        size = 0
+        for chunk in export_chunks(table, format_, compress):
+            output.write(chunk)
+            size += len(chunk)
+        output.flush()
+        click.echo("%s: %d bytes in %.1fs" % (table, size, time.perf_counter() - started), err=True)
+
+    @data.command("import")
+    @click.argument("paths", nargs=-1, required=True, type=click.Path(exists=True))
+    @click.option("--upsert", is_flag=True, help="Update rows that match on id or natural key instead of adding them.")
+    @click.option("--replace", is_flag=True, help="Drop and recreate every table first.")
+    @click.option("--yes", is_flag=True, help="Don't ask before --replace.")
+    def data_import(paths, upsert, replace, yes):
+        """Load NDJSON/CSV table files (planets.ndjson, people.csv.gz, ...) or directories of them."""
+        try:
+            files = import_files(paths)
+        except DataImportError as error:
+            raise click.ClickException(str(error))
+        if not files:
+            raise click.ClickException("No table files in " + ", ".join(paths))
+        if replace:
+            if not yes:
+                click.confirm("This drops and recreates every table. Continue?", abort=True)
+            recreate_tables()
+        started = time.perf_counter()
+        total = 0
+        try:
+            with db.engine.begin() as connection:
+                if connection.dialect.name == "sqlite":
+                    connection.exec_driver_sql("PRAGMA synchronous = OFF")
+                # first: on SQLite this opens the transaction, so the index drops are part of it
+                bump_versions(connection, [table_name for table_name, _ in files])
+                importer = Importer(connection, upsert)
+                for table_name, table_files in files:
+                    table_started = time.perf_counter()
+                    count = importer.load(table_name, table_files)
+                    elapsed = time.perf_counter() - table_started
+                    total += count
+                    click.echo("%-10s %10d rows %8.1fs %10.0f rows/s" % (table_name, count, elapsed, count / elapsed if elapsed else 0))
+        except DataImportError as error:
+            raise click.ClickException(str(error))
+        except IntegrityError as error:
+            raise click.ClickException(str(error.orig))
+        reconcile_favorite_counts()
+        with db.engine.begin() as connection:
+            reset_favorites_versions(connection)
+        favorites_cache.clear()
+        with db.engine.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        elapsed = time.perf_counter() - started
+        click.echo("%d rows in %.1fs, %.0f rows/s" % (total, elapsed, total / elapsed if elapsed else 0))
@@ -0,0 +1,167 @@
+"""
+Database URL and engine/pool configuration, read from the environment.
+
+    DATABASE_URL, DATABASE_READ_URL (optional replica for GET requests)
+
+    DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_TIMEOUT, DB_POOL_RECYCLE,
+    DB_POOL_PRE_PING, DB_STATEMENT_TIMEOUT_MS
+
+PostgreSQL gets a statement_timeout and pre-ping/recycle so connections
+dropped by the server never reach a request. SQLite has no statement
+timeout, so there the value is used as the lock (busy) wait instead.
+"""
+import os
+import threading
+import time
+from functools import wraps
+from flask import current_app, g, has_request_context, request
+from flask_sqlalchemy.session import Session
+from sqlalchemy.pool import QueuePool
+
+def env_int(name, default):
+    return int(os.getenv(name, default))
+
+def env_bool(name, default):
+    return os.getenv(name, str(default)).lower() in ("1", "true", "yes")
+
+def database_url():
+    db_url = os.getenv("DATABASE_URL")
+    if db_url is not None:
+        return db_url.replace("postgres://", "postgresql://")
+    return "sqlite:////tmp/test.db"
+
+def database_read_url():
+    db_url = os.getenv("DATABASE_READ_URL")
+    if db_url is not None:
+        return db_url.replace("postgres://", "postgresql://")
+    return None
+
+class PoolMetrics:
+    # how long requests wait to get a connection out of the pool
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.timeouts = 0
+
+    def observe(self, seconds, timed_out=False):
+        with self.lock:
+            self.checkouts += 1
+            self.wait_seconds_total += seconds
+            self.wait_seconds_max = max(self.wait_seconds_max, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def stats(self):
+        with self.lock:
+            return {
+                "checkouts": self.checkouts,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "timeouts": self.timeouts,
+            }
+
+pool_metrics = PoolMetrics()
+
+class TimedQueuePool(QueuePool):
+
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except Exception:
+            pool_metrics.observe(time.perf_counter() - start, timed_out=True)
+            raise
+        pool_metrics.observe(time.perf_counter() - start)
+        return connection
+
+def engine_options(url):
+    if url in ("sqlite://", "sqlite:///:memory:"):
+        # Flask-SQLAlchemy pins in-memory databases to a single connection
+        return {}
+    sqlite = url.startswith("sqlite")
+    options = {
+        "poolclass": TimedQueuePool,
+        "pool_size": env_int("DB_POOL_SIZE", 5),
+        "max_overflow": env_int("DB_MAX_OVERFLOW", 5 if sqlite else 10),
+        "pool_timeout": env_int("DB_POOL_TIMEOUT", 30),
+        "pool_pre_ping": env_bool("DB_POOL_PRE_PING", not sqlite),
+    }
+    if sqlite:
+        options["connect_args"] = {"timeout": env_int("DB_STATEMENT_TIMEOUT_MS", 5000) / 1000}
+    else:
+        options["pool_recycle"] = env_int("DB_POOL_RECYCLE", 1800)
+    if url.startswith("postgresql"):
+        options["connect_args"] = {"options": "-c statement_timeout=%d" % env_int("DB_STATEMENT_TIMEOUT_MS", 30000)}
+    return options
+
+def async_database_url(url):
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+def async_engine_options(url):
+    # same knobs as engine_options(); the pool class and driver arguments differ
+    options = engine_options(url)
+    options.pop("poolclass", None)
+    if url.startswith("postgresql"):
+        options["connect_args"] = {"server_settings": {"statement_timeout": str(env_int("DB_STATEMENT_TIMEOUT_MS", 30000))}}
+    return options
+
+READ_METHODS = ("GET", "HEAD", "OPTIONS")
+
+class RoutingSession(Session):
+    """
+    Sends the reads of GET/HEAD/OPTIONS requests to the "replica" bind.
+    Flushes, DML and everything after the first write of a request go to
+    the primary, and so do routes marked with @use_primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self.info.get("wrote"):
+            if self._flushing or (clause is not None and clause.is_dml):
+                self.info["wrote"] = True
+            elif reads_from_replica():
+                return self._db.engines["replica"]
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+def reads_from_replica():
+    if not has_request_context() or "replica" not in current_app.config.get("SQLALCHEMY_BINDS", {}):
+        return False
+    route = g.get("database_route")
+    if route is not None:
+        return route == "replica"
+    return request.method in READ_METHODS
+
+def route_to(bind):
+    # per-route override: "primary" for read-your-writes GETs, "replica" for read-only POSTs
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            g.database_route = bind
+            return view(*args, **kwargs)
+        return wrapper
+    return decorator
+
+use_primary = route_to("primary")
+
+def dispose_engines(app):
+    # close=False: the parent process still owns those sockets, the child
+    # just forgets them and opens its own
+    with app.app_context():
+        for engine in app.extensions["sqlalchemy"].engines.values():
+            engine.dispose(close=False)
+
+def setup_database(app):
+    url = database_url()
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(url)
+    read_url = database_read_url()
+    if read_url is not None:
+        app.config['SQLALCHEMY_BINDS'] = {"replica": {"url": read_url, **engine_options(read_url)}}
+    # gunicorn (with --preload), multiprocessing, etc. must never share pooled connections
+    os.register_at_fork(after_in_child=lambda: dispose_engines(app))
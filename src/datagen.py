@@ -0,0 +1,113 @@
+"""
+Deterministic synthetic data for load tests (`flask data generate`).
+
+The same counts and seed always give the same rows, so benchmark runs on
+different commits see the same database. Tables are assumed freshly
+created: ids come out as 1..n, which is what the foreign keys and the
+favorites below point at.
+"""
+import random
+import zlib
+
+SYLLABLES = (
+    "ka", "lo", "mi", "nu", "ra", "ze", "to", "bi", "qu", "sa", "do", "fe", "gi", "ha", "jo", "ly",
+    "ar", "en", "is", "or", "ul", "an", "el", "in", "on", "un", "th", "sk", "dr", "br", "vo", "ix",
+    "ta", "ne", "ri", "mo", "ku", "pa", "le", "si", "wo", "ya", "xa", "ce", "du", "go", "hi", "ju",
+    "ve", "zo", "ro", "na", "xe", "ke", "lu", "po", "te", "da", "gu", "bo", "fi", "wa", "re", "so",
+)
+CLIMATES = ("arid", "temperate", "tropical", "frozen", "murky", "windy", "humid")
+GRAVITIES = ("1 standard", "0.5 standard", "1.5 standard", "unknown")
+COLORS = ("blue", "brown", "green", "hazel", "grey", "amber", "red", "black", "yellow", "white")
+CLASSIFICATIONS = ("mammal", "reptile", "amphibian", "artificial", "insectoid", "sentient")
+VEHICLE_CLASSES = ("wheeled", "repulsorcraft", "starfighter", "walker", "speeder", "airspeeder")
+FAVORITE_TYPES = ("person", "planet", "species", "vehicle")
+
+def name(kind, id):
+    # a cheap hash of the id picks the syllables, so favorites can name their
+    # item without looking it up
+    h = (id * 2654435761 + zlib.crc32(kind.encode())) % 2 ** 32
+    first = SYLLABLES[h & 63] + SYLLABLES[(h >> 6) & 63] + SYLLABLES[(h >> 12) & 63]
+    second = SYLLABLES[(h >> 18) & 63] + SYLLABLES[(h >> 24) & 63]
+    return ("%s %s" % (first, second)).title()
+
+def maybe(rng, value, ratio=0.1):
+    return None if rng.random() < ratio else value
+
+def planets(rng, count):
+    for id in range(1, count + 1):
+        yield (
+            name("planet", id), rng.choice(CLIMATES), maybe(rng, rng.randint(0, 100)),
+            maybe(rng, rng.randint(1000, 200000)), rng.choice(GRAVITIES), maybe(rng, rng.randint(50, 5000)),
+            maybe(rng, rng.randint(0, 10 ** 12))
+        )
+
+def species(rng, count, planet_count):
+    for id in range(1, count + 1):
+        yield (
+            name("species", id), rng.choice(CLASSIFICATIONS), "sentient", rng.choice(COLORS), rng.choice(COLORS),
+            name("language", id), rng.choice(COLORS), maybe(rng, rng.randint(20, 1000)),
+            maybe(rng, rng.randint(50, 400)), maybe(rng, rng.randint(1, planet_count)) if planet_count else None
+        )
+
+def people(rng, count, species_count, planet_count):
+    for id in range(1, count + 1):
+        yield (
+            name("person", id), rng.choice(("male", "female", "n/a")), rng.choice(COLORS), rng.choice(COLORS),
+            maybe(rng, rng.randint(60, 260)), rng.choice(COLORS), maybe(rng, rng.randint(20, 200)),
+            maybe(rng, rng.randint(1, species_count)) if species_count else None,
+            maybe(rng, rng.randint(1, planet_count)) if planet_count else None
+        )
+
+def vehicles(rng, count):
+    for id in range(1, count + 1):
+        yield (
+            name("vehicle", id), rng.choice(("1 week", "2 months", "1 year", "unknown")),
+            maybe(rng, rng.randint(0, 10 ** 6)), maybe(rng, rng.randint(10, 1500)), maybe(rng, rng.randint(1, 200)),
+            maybe(rng, rng.randint(2, 500)), name("model", id), rng.choice(VEHICLE_CLASSES)
+        )
+
+def users(rng, count):
+    for id in range(1, count + 1):
+        yield (name("user", id), "user%d@example.com" % id, "1234", rng.random() < 0.9)
+
+def favorites_capacity(user_count, item_counts):
+    # favorites() walks the users round robin, then the types; every
+    # (user, type) pair can hold each item of that type once
+    return user_count * len(FAVORITE_TYPES) * min(item_counts[item_type] for item_type in FAVORITE_TYPES)
+
+def favorites(count, user_count, item_counts):
+    for k in range(count):
+        user_id = k % user_count + 1
+        rest = k // user_count
+        item_type = FAVORITE_TYPES[rest % len(FAVORITE_TYPES)]
+        # distinct for each (user, type) as long as rest // 4 < item count;
+        # the user offset spreads popularity instead of piling it on id 1
+        item_id = (rest // len(FAVORITE_TYPES) + user_id * 7919) % item_counts[item_type] + 1
+        yield (user_id, item_id, item_type, name(item_type, item_id))
+
+COLUMNS = {
+    "planets": ("name", "climate", "surface_water", "diameter", "gravity", "orbital_period", "population"),
+    "species": ("name", "classification", "designation", "eye_colors", "skin_colors", "language", "hair_colors",
+                "average_lifespan", "average_height", "homeworld_id"),
+    "people": ("name", "gender", "skin_color", "hair_color", "height", "eye_color", "mass", "species_id", "homeworld_id"),
+    "vehicles": ("name", "consumables", "cargo_capacity", "max_atmosphering_speed", "crew", "length", "model",
+                 "vehicle_class"),
+    "users": ("name", "email", "password", "is_active"),
+    "favorites": ("user_id", "item_id", "item_type", "item_name"),
+}
+
+def generate(counts, seed=42):
+    """(table name, rows) in foreign key order; rows are lazy tuples in COLUMNS order."""
+    rng = random.Random(seed)
+    item_counts = {
+        "person": counts["people"], "planet": counts["planets"],
+        "species": counts["species"], "vehicle": counts["vehicles"],
+    }
+    return [
+        ("planets", planets(rng, counts["planets"])),
+        ("species", species(rng, counts["species"], counts["planets"])),
+        ("people", people(rng, counts["people"], counts["species"], counts["planets"])),
+        ("vehicles", vehicles(rng, counts["vehicles"])),
+        ("users", users(rng, counts["users"])),
+        ("favorites", favorites(counts["favorites"], counts["users"], item_counts)),
+    ]
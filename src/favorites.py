@@ -0,0 +1,175 @@
+"""
+Favorites of every item type through one code path: a single
+INSERT ... SELECT ... ON CONFLICT DO NOTHING to add, a DELETE ... RETURNING
+to remove. Counts and caches follow the rows that actually changed.
+"""
+from itertools import chain
+from sqlalchemy import and_, delete, event, exists, func, inspect, literal, or_, select, union_all, update
+from sqlalchemy.dialects import postgresql, sqlite
+from models import db, Favorites, TableVersions, Users, FAVORITE_MODELS, change_favorite_count
+from cache import response_cache
+from favorites_cache import favorites_cache
+from utils import APIException
+from versions import bump_versions
+
+FAVORITES_BATCH_MAX = 1000
+RETURNED_COLUMNS = (Favorites.id, Favorites.user_id, Favorites.item_type, Favorites.item_id, Favorites.item_name)
+# change_favorites() bumps the tables (and the user) it wrote itself, once,
+# and only if a row changed
+UNVERSIONED = {"bump_versions": False}
+
+def group_pairs(pairs):
+    # [(item_type, item_id)] -> {item_type: [item_id]}, first occurrence wins
+    grouped = {}
+    for item_type, item_id in pairs:
+        ids = grouped.setdefault(item_type, [])
+        if item_id not in ids:
+            ids.append(item_id)
+    return grouped
+
+def dialect_insert():
+    return postgresql.insert if db.session.get_bind().dialect.name == "postgresql" else sqlite.insert
+
+def insert_favorites(user_id, pairs):
+    grouped = group_pairs(pairs)
+    user_exists = exists(select(Users.id).where(Users.id == user_id))
+    selects = [
+        select(literal(user_id), model.id, literal(item_type), model.name).where(model.id.in_(ids), user_exists)
+        for item_type, ids in grouped.items()
+        for model in [FAVORITE_MODELS[item_type]]
+    ]
+    source = selects[0] if len(selects) == 1 else union_all(*selects)
+    stmt = dialect_insert()(Favorites).from_select(
+        ["user_id", "item_id", "item_type", "item_name"], source
+    ).on_conflict_do_nothing(
+        index_elements=["user_id", "item_type", "item_id"]
+    ).returning(*RETURNED_COLUMNS)
+    rows = db.session.execute(stmt, execution_options=UNVERSIONED)
+    return sorted((dict(row._mapping) for row in rows), key=lambda row: row["id"])
+
+def delete_favorites(user_id, pairs):
+    grouped = group_pairs(pairs)
+    stmt = delete(Favorites).where(
+        Favorites.user_id == user_id,
+        or_(*[and_(Favorites.item_type == item_type, Favorites.item_id.in_(ids)) for item_type, ids in grouped.items()])
+    ).returning(*RETURNED_COLUMNS)
+    rows = db.session.execute(stmt, execution_options=UNVERSIONED)
+    return sorted((dict(row._mapping) for row in rows), key=lambda row: row["id"])
+
+def apply_counts(rows, delta):
+    grouped = group_pairs((row["item_type"], row["item_id"]) for row in rows)
+    for item_type, ids in grouped.items():
+        change_favorite_count(item_type, ids, delta, UNVERSIONED)
+    return grouped
+
+def invalidate(grouped):
+    for item_type, ids in grouped.items():
+        resource = FAVORITE_MODELS[item_type].__tablename__
+        if len(ids) == 1:
+            response_cache.invalidate(resource, ids[0])
+        else:
+            response_cache.invalidate(resource)
+
+def change_favorites(user_id, add=(), remove=()):
+    """Remove, then add, (item_type, item_id) pairs in one transaction; returns the rows changed."""
+    try:
+        removed = delete_favorites(user_id, remove) if remove else []
+        added = insert_favorites(user_id, add) if add else []
+        if not added and not removed:
+            db.session.rollback()
+            return added, removed
+        touched = [apply_counts(removed, -1), apply_counts(added, 1)]
+        after = db.session.scalar(
+            update(Users).where(Users.id == user_id)
+            .values(favorites_version=Users.favorites_version + 1).returning(Users.favorites_version),
+            execution_options=UNVERSIONED,
+        )
+        tables = {FAVORITE_MODELS[item_type].__tablename__ for grouped in touched for item_type in grouped}
+        bump_versions(db.session.connection(), tables | {"favorites"})
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+    for grouped in touched:
+        invalidate(grouped)
+    favorites_cache.apply(user_id, added, removed, after - 1, after)
+    return added, removed
+
+def bump_favorites_versions(connection, user_ids=None):
+    # favorites written anywhere but change_favorites(); None: every user
+    stmt = update(Users).values(favorites_version=Users.favorites_version + 1)
+    if user_ids is not None:
+        stmt = stmt.where(Users.id.in_(sorted(user_ids)))
+    connection.execute(stmt)
+
+def reset_favorites_versions(connection):
+    # after a bulk load: every user starts at the favorites table version, which
+    # is at least any user's version before the load and was bumped by the load
+    version = select(TableVersions.version).where(TableVersions.table_name == Favorites.__tablename__)
+    connection.execute(update(Users).values(favorites_version=func.coalesce(version.scalar_subquery(), 0)))
+
+@event.listens_for(db.session, "after_flush")
+def bump_flushed_favorites(session, flush_context):
+    # Flask-Admin edits and the DELETE /users/<id> cascade
+    user_ids = set()
+    for obj in chain(session.new, session.dirty, session.deleted):
+        if isinstance(obj, Favorites):
+            user_ids.add(obj.user_id)
+            user_ids.update(inspect(obj).attrs.user_id.history.deleted)
+    user_ids -= {obj.id for obj in session.deleted if isinstance(obj, Users)}
+    user_ids.discard(None)
+    if user_ids:
+        bump_favorites_versions(session.connection(), user_ids)
+
+@event.listens_for(db.session, "do_orm_execute")
+def bump_executed_favorites(orm_execute_state):
+    # a bulk insert/update/delete on favorites doesn't say whose rows it wrote
+    if not orm_execute_state.execution_options.get("bump_versions", True):
+        return
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        if orm_execute_state.statement.table.name == Favorites.__tablename__:
+            bump_favorites_versions(orm_execute_state.session.connection())
+
+def add_favorite(user_id, item_type, item_id):
+    added, _ = change_favorites(user_id, add=[(item_type, item_id)])
+    return added[0] if added else None
+
+def add_failure(user_id, item_type, item_id):
+    # why add_favorite() inserted nothing: (message, status), only on this rare path
+    if db.session.get(Users, user_id) is None:
+        return "User not found", 404
+    if db.session.get(FAVORITE_MODELS[item_type], item_id) is None:
+        return "%s not found" % item_type.capitalize(), 404
+    return "%s already in favorites" % item_type.capitalize(), 400
+
+def remove_favorite(user_id, item_type, item_id):
+    _, removed = change_favorites(user_id, remove=[(item_type, item_id)])
+    return removed[0] if removed else None
+
+def read_pairs(items, key):
+    if not isinstance(items, list):
+        raise APIException("%s must be a list of {\"type\", \"id\"} objects" % key)
+    pairs, errors = [], []
+    for index, item in enumerate(items):
+        item_type = item.get("type") if isinstance(item, dict) else None
+        item_id = item.get("id") if isinstance(item, dict) else None
+        if item_type not in FAVORITE_MODELS:
+            errors.append({"index": index, "errors": {"type": "must be one of " + ", ".join(FAVORITE_MODELS)}})
+        elif isinstance(item_id, bool) or not isinstance(item_id, int):
+            errors.append({"index": index, "errors": {"id": "must be an integer"}})
+        else:
+            pairs.append((item_type, item_id))
+    if errors:
+        raise APIException("Invalid %s items" % key, payload={key: errors})
+    return pairs
+
+def read_batch(data):
+    if not isinstance(data, dict) or not set(data) <= {"add", "remove"}:
+        raise APIException("Expected a JSON object with \"add\" and/or \"remove\" lists")
+    add = read_pairs(data.get("add", []), "add")
+    remove = read_pairs(data.get("remove", []), "remove")
+    if not add and not remove:
+        raise APIException("No favorites to change")
+    if len(add) + len(remove) > FAVORITES_BATCH_MAX:
+        raise APIException("At most %d favorites per request" % FAVORITES_BATCH_MAX, status_code=413)
+    return add, remove
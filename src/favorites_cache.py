@@ -0,0 +1,323 @@
+"""
+Per-user favorites cache, patched by favorites.py rather than dropped.
+
+    FAVORITES_CACHE_URL    redis://... shared between workers, fake:// for
+                           FakeRedis below, unset for in-process
+    FAVORITES_CACHE_SIZE   users kept in process (0 disables the cache)
+    FAVORITES_CACHE_TTL    seconds an entry lives, in either backend
+
+A set is served only while its user's favorites_version is current; replica
+reads are never stored.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from sqlalchemy import select
+from models import db, Favorites, Users
+from database import reads_from_replica
+
+try:
+    import redis
+    from redis import WatchError
+except ImportError:
+    redis = None
+
+    class WatchError(Exception):
+        pass
+
+FAVORITE_FIELDS = ("id", "user_id", "item_type", "item_id", "item_name")
+
+class MemoryFavoritesStore:
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        # user id -> (expires, favorites version, {favorite id: row})
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get_many(self, versions):
+        # versions: {user id: favorites_version}
+        found = {}
+        now = time.monotonic()
+        with self.lock:
+            for user_id, version in versions.items():
+                entry = self.entries.get(user_id)
+                if entry is None or entry[0] < now or entry[1] < version:
+                    if entry is not None:
+                        del self.entries[user_id]
+                        self.evictions += 1
+                    self.misses += 1
+                    continue
+                if entry[1] != version:
+                    # read at a newer version than this request saw (a lagging replica)
+                    self.misses += 1
+                    continue
+                self.entries.move_to_end(user_id)
+                self.hits += 1
+                found[user_id] = list(entry[2].values())
+        return found
+
+    def store(self, user_id, rows, version):
+        if self.maxsize <= 0:
+            return
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is not None and entry[1] > version:
+                return
+            self.entries[user_id] = (time.monotonic() + self.ttl, version, {row["id"]: row for row in rows})
+            self.entries.move_to_end(user_id)
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+                self.evictions += 1
+
+    def apply(self, user_id, added, removed, before, after):
+        with self.lock:
+            entry = self.entries.get(user_id)
+            if entry is None:
+                return
+            if entry[1] != before:
+                del self.entries[user_id]
+                return
+            favorites = entry[2]
+            for row in removed:
+                favorites.pop(row["id"], None)
+            for row in added:
+                favorites[row["id"]] = row
+            # keep id order, which is insertion order for new rows anyway
+            self.entries[user_id] = (entry[0], after, dict(sorted(favorites.items())) if added else favorites)
+
+    def discard(self, user_id):
+        with self.lock:
+            self.entries.pop(user_id, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "backend": "memory",
+                "size": len(self.entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+class RedisFavoritesStore:
+    # favorites:<user>  hash of favorite id -> JSON row, plus VERSION, the
+    #                   user's favorites_version it was read at (absent: not loaded)
+
+    VERSION = "version"
+
+    def __init__(self, client, ttl=300, prefix="favorites:"):
+        self.client = client
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, user_id):
+        return "%s%d" % (self.prefix, user_id)
+
+    def get_many(self, versions):
+        user_ids = list(versions)
+        pipe = self.client.pipeline(transaction=False)
+        for user_id in user_ids:
+            pipe.hgetall(self.key(user_id))
+        found = {}
+        for user_id, fields in zip(user_ids, pipe.execute()):
+            fields = {decode(name): value for name, value in fields.items()}
+            stored = fields.pop(self.VERSION, None)
+            if stored is None or int(stored) != versions[user_id]:
+                continue
+            found[user_id] = sorted((json.loads(value) for value in fields.values()), key=lambda row: row["id"])
+        with self.lock:
+            self.hits += len(found)
+            self.misses += len(user_ids) - len(found)
+        return found
+
+    def store(self, user_id, rows, version):
+        key = self.key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                stored = pipe.hget(key, self.VERSION)
+                if stored is not None and int(stored) > version:
+                    return
+                pipe.multi()
+                pipe.delete(key)
+                pipe.hset(key, mapping=dict({str(row["id"]): json.dumps(row) for row in rows}, **{self.VERSION: str(version)}))
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except WatchError:
+                pass
+
+    def apply(self, user_id, added, removed, before, after):
+        key = self.key(user_id)
+        with self.client.pipeline() as pipe:
+            try:
+                pipe.watch(key)
+                stored = pipe.hget(key, self.VERSION)
+                if stored is None:
+                    return
+                if int(stored) != before:
+                    self.client.delete(key)
+                    return
+                pipe.multi()
+                if removed:
+                    pipe.hdel(key, *[str(row["id"]) for row in removed])
+                pipe.hset(key, mapping=dict({str(row["id"]): json.dumps(row) for row in added}, **{self.VERSION: str(after)}))
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except WatchError:
+                self.client.delete(key)
+
+    def discard(self, user_id):
+        self.client.delete(self.key(user_id))
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=self.prefix + "*"))
+        if keys:
+            self.client.delete(*keys)
+
+    def stats(self):
+        with self.lock:
+            return {"backend": "redis", "ttl": self.ttl, "hits": self.hits, "misses": self.misses}
+
+def decode(value):
+    return value.decode() if isinstance(value, bytes) else value
+
+class FakeRedis:
+    """The subset of redis.Redis the store uses, in memory, for local runs and tests."""
+
+    def __init__(self):
+        self.data = {}
+        self.versions = {}
+        self.lock = threading.RLock()
+
+    def touch(self, key):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def hget(self, key, field):
+        return self.data.get(key, {}).get(field)
+
+    def expire(self, key, seconds):
+        return key in self.data
+
+    def delete(self, *keys):
+        with self.lock:
+            for key in keys:
+                self.data.pop(key, None)
+                self.touch(key)
+
+    def hgetall(self, key):
+        return dict(self.data.get(key, {}))
+
+    def hset(self, key, mapping):
+        with self.lock:
+            self.data.setdefault(key, {}).update(mapping)
+            self.touch(key)
+
+    def hdel(self, key, *fields):
+        with self.lock:
+            for field in fields:
+                self.data.get(key, {}).pop(field, None)
+            self.touch(key)
+
+    def scan_iter(self, match="*"):
+        prefix = match.rstrip("*")
+        return [key for key in list(self.data) if key.startswith(prefix)]
+
+    def pipeline(self, transaction=True):
+        return FakePipeline(self)
+
+class FakePipeline:
+
+    def __init__(self, client):
+        self.client = client
+        self.commands = []
+        self.watched = {}
+        self.buffering = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.commands = []
+
+    def watch(self, *keys):
+        self.watched = {key: self.client.versions.get(key, 0) for key in keys}
+        self.buffering = False
+
+    def multi(self):
+        self.buffering = True
+
+    def __getattr__(self, name):
+        command = getattr(self.client, name)
+
+        def call(*args, **kwargs):
+            if not self.buffering:
+                return command(*args, **kwargs)
+            self.commands.append((command, args, kwargs))
+            return self
+        return call
+
+    def execute(self):
+        with self.client.lock:
+            if any(self.client.versions.get(key, 0) != version for key, version in self.watched.items()):
+                self.commands = []
+                raise WatchError()
+            results = [command(*args, **kwargs) for command, args, kwargs in self.commands]
+        self.commands = []
+        return results
+
+def make_store():
+    url = os.getenv("FAVORITES_CACHE_URL")
+    ttl = float(os.getenv("FAVORITES_CACHE_TTL", 300))
+    if url == "fake://":
+        return RedisFavoritesStore(FakeRedis(), ttl)
+    if url:
+        if redis is None:
+            raise RuntimeError("FAVORITES_CACHE_URL needs the redis package")
+        return RedisFavoritesStore(redis.Redis.from_url(url), ttl)
+    return MemoryFavoritesStore(maxsize=int(os.getenv("FAVORITES_CACHE_SIZE", 10000)), ttl=ttl)
+
+favorites_cache = make_store()
+
+def user_favorites(user_ids, session=None, store=None, versions=None):
+    """{user_id: [favorite row, ...]} in id order; one query for all the cache misses.
+
+    versions: {user_id: favorites_version}, when the caller has already loaded the users.
+    """
+    session = db.session if session is None else session
+    if store is None:
+        store = not reads_from_replica()
+    # read before the rows: a set is never labelled newer than what it holds
+    if versions is None:
+        versions = dict(session.execute(select(Users.id, Users.favorites_version).where(Users.id.in_(user_ids))).all())
+    found = favorites_cache.get_many({user_id: versions[user_id] for user_id in user_ids if user_id in versions})
+    missing = [user_id for user_id in user_ids if user_id not in found]
+    if not missing:
+        return found
+    loaded = {user_id: [] for user_id in missing}
+    stmt = select(*[getattr(Favorites, name) for name in FAVORITE_FIELDS]).where(
+        Favorites.user_id.in_(missing)
+    ).order_by(Favorites.id)
+    for row in session.execute(stmt):
+        loaded[row[1]].append(dict(zip(FAVORITE_FIELDS, row)))
+    if store:
+        for user_id, rows in loaded.items():
+            if user_id in versions:
+                favorites_cache.store(user_id, rows, versions[user_id])
+    found.update(loaded)
+    return found
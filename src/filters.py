@@ -0,0 +1,77 @@
+"""
+Declarative filters and sorting for the list endpoints.
+
+    ?climate=arid                 equality
+    ?population__gte=1000000      eq, ne, gt, gte, lt, lte (numbers)
+    ?climate__in=arid,temperate   in (comma separated)
+    ?species_id__isnull=true      isnull
+    ?sort=-diameter               one column, "-" for descending
+
+A parameter is a filter when its column part (before "__") is in the
+model's filter_columns; any other parameter (cache busters, tracking
+params, ...) is ignored. A bad operator or value on a filter column, or a
+?sort= outside sort_columns, is a 400 naming the allowed ones.
+"""
+from sqlalchemy import Integer
+from models import db
+from search import name_prefix_clause
+from utils import APIException
+
+NUMBER_OPERATORS = ("eq", "ne", "gt", "gte", "lt", "lte", "in", "isnull")
+STRING_OPERATORS = ("eq", "ne", "in", "isnull")
+
+def operators(column):
+    return NUMBER_OPERATORS if isinstance(column.type, Integer) else STRING_OPERATORS
+
+def convert(column, key, value):
+    if not isinstance(column.type, Integer):
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise APIException("%s must be an integer" % key)
+
+def filter_clause(model, key, value):
+    name, _, operator = key.partition("__")
+    column = getattr(model, name)
+    operator = operator or "eq"
+    if operator not in operators(column):
+        raise APIException("Unknown operator: " + key, payload={"allowed": list(operators(column))})
+    if operator == "isnull":
+        if value not in ("true", "false"):
+            raise APIException("%s must be true or false" % key)
+        return column.is_(None) if value == "true" else column.is_not(None)
+    if operator == "in":
+        return column.in_([convert(column, key, item) for item in value.split(",")])
+    value = convert(column, key, value)
+    return {
+        "eq": column == value,
+        "ne": column != value,
+        "gt": column > value,
+        "gte": column >= value,
+        "lt": column < value,
+        "lte": column <= value,
+    }[operator]
+
+def filter_rows(stmt, model, args, dialect=None):
+    for key in args:
+        if key.partition("__")[0] not in model.filter_columns:
+            continue
+        for value in args.getlist(key):
+            stmt = stmt.where(filter_clause(model, key, value))
+    prefix = args.get("name_prefix")
+    if prefix:
+        dialect = db.session.get_bind().dialect.name if dialect is None else dialect
+        stmt = stmt.where(name_prefix_clause(model, prefix, dialect))
+    return stmt
+
+def parse_sort(model, args):
+    # ?sort=-diameter -> (Planets.diameter, True); None keeps the id order
+    if "sort" not in args:
+        return None
+    name = args["sort"].strip()
+    descending = name.startswith("-")
+    name = name.lstrip("-")
+    if name not in model.sort_columns:
+        raise APIException("Invalid sort: " + args["sort"], payload={"allowed": list(model.sort_columns)})
+    return getattr(model, name), descending
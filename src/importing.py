@@ -0,0 +1,273 @@
+"""
+Bulk import of table files (`flask data import`): what `flask data export`
+writes, and the seed data in data/seed.
+
+Files are named after their table (planets.ndjson, people.csv.gz, ...) and
+load in foreign key order. A reference is either the id column or a natural
+key: species/homeworld by name, a favorite's user by email and its item by
+name (with item_type; item_name is filled in). Each referenced table is
+read once into an in-memory Lookup, so resolving costs a dict get per row.
+Rows then go through loading.py: COPY on PostgreSQL, executemany elsewhere.
+
+With upsert, a row matches an existing one on its id, else on its natural
+key (the first row with that name or email; user + item for favorites),
+and updates it: running the same import twice changes nothing. A table
+that starts out empty loads with its secondary indexes dropped and builds
+them once at the end.
+
+The whole import is one transaction; a bad row (reported as file:line)
+leaves the database as it was.
+"""
+import csv
+import gzip
+import json
+import os
+from functools import cache
+from sqlalchemy import Boolean, DDL, Integer, String, select
+from sqlalchemy.schema import CreateIndex
+from models import db, FAVORITE_MODELS
+from loading import chunked, load_rows, upsert_rows
+from schemas import check_value
+from search import postgresql_search_indexes, sqlite_search_statements
+
+IMPORT_ORDER = ("planets", "species", "people", "vehicles", "users", "favorites")
+IMPORT_FORMATS = ("ndjson", "csv")
+# foreign key column -> (natural key field, referenced table)
+REFERENCES = {
+    "species": {"homeworld_id": ("homeworld", "planets")},
+    "people": {"species_id": ("species", "species"), "homeworld_id": ("homeworld", "planets")},
+    "favorites": {"user_id": ("user", "users")},
+}
+NATURAL_KEYS = {"users": "email"}
+# favorites have no natural key a Lookup can map to an id; upserts match on this instead
+UNIQUE_KEYS = {"favorites": ("user_id", "item_type", "item_id")}
+# recounted (and reseeded) from favorites after every import
+SKIPPED_COLUMNS = ("favorite_count", "favorites_version")
+# fields that name a reference instead of giving its id ("item" goes with item_type)
+REFERENCE_FIELDS = {
+    table_name: {field for field, _ in references.values()} | ({"item"} if table_name == "favorites" else set())
+    for table_name, references in REFERENCES.items()
+}
+CSV_BOOLEANS = {"true": True, "t": True, "1": True, "false": False, "f": False, "0": False}
+
+class DataImportError(Exception):
+    pass
+
+def import_files(paths):
+    """[(table name, [(format, path), ...])] in IMPORT_ORDER; directories contribute their table files."""
+    found = {}
+    for path in paths:
+        explicit = not os.path.isdir(path)
+        names = [path] if explicit else [os.path.join(path, name) for name in sorted(os.listdir(path))]
+        for name in names:
+            stem = os.path.basename(name)
+            stem = stem[:-3] if stem.endswith(".gz") else stem
+            table_name, _, format = stem.partition(".")
+            if table_name in IMPORT_ORDER and format in IMPORT_FORMATS:
+                found.setdefault(table_name, []).append((format, name))
+            elif explicit:
+                raise DataImportError("%s: expected <table>.ndjson or <table>.csv (optionally .gz), table one of %s" % (
+                    name, ", ".join(IMPORT_ORDER)))
+    return [(table_name, found[table_name]) for table_name in IMPORT_ORDER if table_name in found]
+
+def open_text(path):
+    return gzip.open(path, "rt", newline="") if path.endswith(".gz") else open(path, newline="")
+
+def read_records(path, format):
+    """(line number, record) for every row of one file; CSV values are left as text."""
+    with open_text(path) as file:
+        if format == "csv":
+            reader = csv.reader(file)
+            header = next(reader, [])
+            for row in reader:
+                if len(row) != len(header):
+                    raise DataImportError("%s:%d: %d fields, the header has %d" % (path, reader.line_num, len(row), len(header)))
+                yield reader.line_num, dict(zip(header, row))
+            return
+        for number, line in enumerate(file, 1):
+            if not line.strip():
+                continue
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                raise DataImportError("%s:%d: invalid JSON" % (path, number))
+
+def csv_value(column, value):
+    # CSV has no NULL and no types: an empty field is NULL unless the column
+    # is a non-nullable string, numbers and booleans are parsed
+    if value == "":
+        return "" if isinstance(column.type, String) and not column.nullable else None
+    try:
+        if isinstance(column.type, Boolean):
+            return CSV_BOOLEANS.get(value.lower(), value)
+        if isinstance(column.type, Integer):
+            return int(value)
+    except ValueError:
+        pass
+    return value
+
+@cache
+def import_columns(table):
+    """({key: column} a file may set, keys it must set)."""
+    columns = {column.key: column for column in table.columns if column.key not in SKIPPED_COLUMNS}
+    required = [
+        key for key, column in columns.items()
+        if not column.primary_key and not column.nullable and column.server_default is None
+    ]
+    return columns, required
+
+class Lookup:
+    """Every id of one table and the first id for each natural key, read in one query."""
+
+    def __init__(self, connection, table):
+        key = table.c[NATURAL_KEYS.get(table.name, "name")]
+        self.ids = {}
+        self.keys = {}
+        for id, value in connection.execute(select(table.c.id, key).order_by(table.c.id)):
+            self.ids[id] = value
+            self.keys.setdefault(value, id)
+
+class Importer:
+    """Loads table files through one connection, resolving references with Lookups."""
+
+    def __init__(self, connection, upsert=False):
+        self.connection = connection
+        self.upsert = upsert
+        self.lookups = {}
+
+    def lookup(self, table_name):
+        if table_name not in self.lookups:
+            self.lookups[table_name] = Lookup(self.connection, db.metadata.tables[table_name])
+        return self.lookups[table_name]
+
+    def resolve(self, record, values, errors, column, field, table_name, parse):
+        name = record[field]
+        if parse and name == "":
+            name = None
+        if name is None:
+            values[column] = None
+        elif not isinstance(name, str):
+            errors[field] = "must be a string"
+        elif name not in self.lookup(table_name).keys:
+            errors[field] = "%r not found" % name
+        else:
+            values[column] = self.lookup(table_name).keys[name]
+
+    def resolve_item(self, record, values, errors, parse):
+        item_type = values.get("item_type")
+        if item_type not in FAVORITE_MODELS:
+            errors.setdefault("item_type", "must be one of " + ", ".join(FAVORITE_MODELS))
+            return
+        table_name = FAVORITE_MODELS[item_type].__tablename__
+        if "item" in record:
+            self.resolve(record, values, errors, "item_id", "item", table_name, parse)
+        item_id = values.get("item_id")
+        if item_id is None or "item" in errors:
+            return
+        if item_id not in self.lookup(table_name).ids:
+            errors["item_id"] = "not found"
+        elif "item_name" not in values:
+            values["item_name"] = self.lookup(table_name).ids[item_id]
+
+    def row_values(self, table, record, parse=False):
+        """(column values, errors) for one record; parse: the values are CSV text."""
+        if not isinstance(record, dict):
+            return None, {"row": "must be an object"}
+        references = REFERENCES.get(table.name, {})
+        fields = REFERENCE_FIELDS.get(table.name, ())
+        columns, required = import_columns(table)
+        values, errors = {}, {}
+        for key, value in record.items():
+            column = columns.get(key)
+            if column is None:
+                if key not in fields and key not in SKIPPED_COLUMNS:
+                    errors[key] = "unknown field"
+                continue
+            if parse:
+                value = csv_value(column, value)
+            if key == "id" and value is None:
+                continue
+            message = check_value(column, value)
+            if message:
+                errors[key] = message
+            else:
+                values[key] = value
+        for column, (field, table_name) in references.items():
+            if field in record:
+                self.resolve(record, values, errors, column, field, table_name, parse)
+            elif values.get(column) is not None and values[column] not in self.lookup(table_name).ids:
+                errors[column] = "not found"
+        if table.name == "favorites":
+            self.resolve_item(record, values, errors, parse)
+        for key in required:
+            if key not in values and key not in errors:
+                errors[key] = "is required"
+        if self.upsert and not errors and "id" not in values and table.name not in UNIQUE_KEYS:
+            id = self.lookup(table.name).keys.get(values[NATURAL_KEYS.get(table.name, "name")])
+            if id is not None:
+                values["id"] = id
+        return values, errors
+
+    def rows(self, table, files):
+        for format, path in files:
+            for number, record in read_records(path, format):
+                values, errors = self.row_values(table, record, format == "csv")
+                if errors:
+                    raise DataImportError("%s:%d: %s" % (
+                        path, number, ", ".join("%s %s" % error for error in errors.items())))
+                yield values
+
+    def defer_indexes(self, table):
+        """Drop the secondary indexes of an empty table; returns the DDL that rebuilds them."""
+        if self.connection.execute(select(table.c.id).limit(1)).first() is not None:
+            return []
+        deferred = []
+        for index in table.indexes:
+            if not index.unique:
+                self.connection.exec_driver_sql("DROP INDEX IF EXISTS " + index.name)
+                deferred.append(CreateIndex(index))
+        item_type = next((item_type for item_type, model in FAVORITE_MODELS.items() if model.__table__ is table), None)
+        if item_type is None:
+            return deferred
+        # the name search index: GIN indexes on PostgreSQL, FTS5 fed by a trigger on SQLite
+        if self.connection.dialect.name == "postgresql":
+            for name, statement in postgresql_search_indexes(table.name).items():
+                self.connection.exec_driver_sql("DROP INDEX IF EXISTS " + name)
+                deferred.append(DDL(statement))
+        elif self.connection.dialect.name == "sqlite":
+            trigger = table.name + "_search_insert"
+            if self.connection.exec_driver_sql(
+                "SELECT 1 FROM sqlite_master WHERE type = 'trigger' AND name = ?", (trigger,)
+            ).first() is not None:
+                self.connection.exec_driver_sql("DROP TRIGGER " + trigger)
+                statements = sqlite_search_statements(item_type)
+                deferred += [DDL(statements["insert"]), DDL(statements["backfill"])]
+        return deferred
+
+    def write(self, table, columns, rows):
+        if not self.upsert or ("id" not in columns and table.name not in UNIQUE_KEYS):
+            return load_rows(self.connection, table, columns, rows)
+        conflict = ("id",) if "id" in columns else UNIQUE_KEYS[table.name]
+        return upsert_rows(self.connection, table, columns, rows, conflict)
+
+    def load(self, table_name, files):
+        """Load one table's files; returns the number of rows written."""
+        table = db.metadata.tables[table_name]
+        deferred = self.defer_indexes(table)
+        count = 0
+        for chunk in chunked(self.rows(table, files)):
+            # records may leave out optional columns: one batch per column set
+            batches = {}
+            for values in chunk:
+                batches.setdefault(tuple(values), []).append(tuple(values.values()))
+            for columns, rows in batches.items():
+                count += self.write(table, columns, rows)
+        for statement in deferred:
+            self.connection.execute(statement)
+        if self.connection.dialect.name == "postgresql":
+            # explicit ids don't advance the sequence
+            self.connection.exec_driver_sql(
+                "SELECT setval(pg_get_serial_sequence('%s', 'id'), coalesce(max(id), 0) + 1, false) FROM %s" % (
+                    table_name, table_name))
+        self.lookups.pop(table_name, None)
+        return count
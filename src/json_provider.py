@@ -0,0 +1,99 @@
+"""
+JSON providers for app.json that encode straight to bytes with orjson or
+msgspec, falling back to Flask's stdlib provider when neither is installed.
+
+    JSON_PROVIDER=orjson|msgspec|stdlib   (default: the first one available)
+
+Output keeps Flask's shape: sorted keys, compact (indented in debug mode)
+and a trailing newline, so ETags and cached bodies don't depend on the
+encoder. Non-ASCII text is sent as UTF-8 instead of \\u escapes. Integers
+beyond 64 bits (which neither library encodes) go through the stdlib
+encoder, so a BigInteger column never fails a response. msgspec writes
+datetimes as ISO 8601 rather than HTTP dates (no model has one today).
+"""
+import dataclasses
+import os
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgspec
+except ImportError:
+    msgspec = None
+
+class StdlibJSONProvider(DefaultJSONProvider):
+
+    @staticmethod
+    def default(o):
+        # response schemas (schemas.py) hold plain values: their __dict__ is
+        # enough, without the deep copy dataclasses.asdict() makes
+        if dataclasses.is_dataclass(o) and not isinstance(o, type) and hasattr(o, "__dict__"):
+            return o.__dict__
+        return DefaultJSONProvider.default(o)
+
+class BytesJSONProvider(StdlibJSONProvider):
+    # subclasses implement encode(obj, indent) -> bytes
+
+    def stdlib_bytes(self, obj, indent):
+        dump_args = {"indent": 2} if indent else {"separators": (",", ":")}
+        return super().dumps(obj, **dump_args).encode()
+
+    def dumps_bytes(self, obj, indent=False):
+        try:
+            return self.encode(obj, indent)
+        except (TypeError, ValueError, OverflowError):
+            # > 64-bit integers, non-string keys mixed with sort_keys...
+            return self.stdlib_bytes(obj, indent)
+
+    def dumps(self, obj, **kwargs):
+        # only the arguments Flask itself passes (separators/indent) have an
+        # equivalent; anything else gets the stdlib encoder
+        if set(kwargs) - {"separators", "indent"} or kwargs.get("separators", (",", ":")) != (",", ":"):
+            return super().dumps(obj, **kwargs)
+        return self.dumps_bytes(obj, bool(kwargs.get("indent"))).decode()
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(self.dumps_bytes(obj, indent) + b"\n", mimetype=self.mimetype)
+
+class ORJSONProvider(BytesJSONProvider):
+
+    def encode(self, obj, indent):
+        option = orjson.OPT_SORT_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        # datetimes go through default() so they stay HTTP dates, like Flask's
+        return orjson.dumps(obj, default=self.default, option=option)
+
+class MsgspecJSONProvider(BytesJSONProvider):
+
+    def __init__(self, app):
+        super().__init__(app)
+        self.encoder = msgspec.json.Encoder(enc_hook=self.default, order="sorted")
+
+    def encode(self, obj, indent):
+        data = self.encoder.encode(obj)
+        return msgspec.json.format(data, indent=2) if indent else data
+
+PROVIDERS = {
+    "orjson": ORJSONProvider if orjson is not None else None,
+    "msgspec": MsgspecJSONProvider if msgspec is not None else None,
+    "stdlib": StdlibJSONProvider,
+}
+
+def json_provider_class(name=None):
+    name = os.getenv("JSON_PROVIDER") if name is None else name
+    if name:
+        if PROVIDERS.get(name) is None:
+            raise RuntimeError("JSON_PROVIDER=%s is not available (install it or pick one of %s)" % (
+                name, ", ".join(key for key, value in PROVIDERS.items() if value is not None)))
+        return PROVIDERS[name]
+    return next(provider for provider in PROVIDERS.values() if provider is not None)
+
+def setup_json(app):
+    app.json = json_provider_class()(app)
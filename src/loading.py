@@ -0,0 +1,87 @@
+"""
+Fast bulk loading of plain row tuples, shared by the data commands.
+
+PostgreSQL (psycopg2) gets COPY ... FROM STDIN in CSV chunks; everything
+else gets one executemany per chunk. Upserts COPY into a temporary staging
+table and merge it with INSERT ... SELECT ... ON CONFLICT. Rows bypass the ORM (no identity map,
+no events), so callers bump the table versions themselves.
+"""
+import io
+from sqlalchemy import insert, table as table_clause
+from sqlalchemy.dialects import postgresql, sqlite
+
+LOAD_CHUNK_SIZE = 10000
+
+def chunked(rows, size=LOAD_CHUNK_SIZE):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def uses_copy(connection):
+    return connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2"
+
+def csv_field(value):
+    # COPY's CSV format reads an unquoted empty field as NULL and "" as ''
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"%s"' % value.replace('"', '""')
+    return str(value)
+
+def copy_chunk(connection, table, columns, chunk):
+    buffer = io.StringIO()
+    for row in chunk:
+        buffer.write(",".join(map(csv_field, row)) + "\n")
+    buffer.seek(0)
+    cursor = connection.connection.dbapi_connection.cursor()
+    try:
+        cursor.copy_expert("COPY %s (%s) FROM STDIN WITH (FORMAT csv)" % (table.name, ", ".join(columns)), buffer)
+    finally:
+        cursor.close()
+
+def load_rows(connection, table, columns, rows, chunk_size=LOAD_CHUNK_SIZE):
+    """Insert an iterable of tuples (in `columns` order) into `table`; returns the row count."""
+    count = 0
+    stmt = insert(table)
+    copy = uses_copy(connection)
+    for chunk in chunked(rows, chunk_size):
+        if copy:
+            copy_chunk(connection, table, columns, chunk)
+        else:
+            connection.execute(stmt, [dict(zip(columns, row)) for row in chunk])
+        count += len(chunk)
+    return count
+
+def upsert_rows(connection, table, columns, rows, conflict, chunk_size=LOAD_CHUNK_SIZE):
+    """load_rows(), but a row that clashes with an existing one on the `conflict` columns updates it."""
+    count = 0
+    updated = [column for column in columns if column not in conflict]
+    if uses_copy(connection):
+        staging = table_clause("staging_" + table.name)
+        connection.exec_driver_sql(
+            "CREATE TEMPORARY TABLE IF NOT EXISTS %s (LIKE %s INCLUDING DEFAULTS) ON COMMIT DROP" % (staging.name, table.name)
+        )
+        merge = "INSERT INTO %s (%s) SELECT %s FROM %s ON CONFLICT (%s) DO %s" % (
+            table.name, ", ".join(columns), ", ".join(columns), staging.name, ", ".join(conflict),
+            "UPDATE SET " + ", ".join("%s = excluded.%s" % (column, column) for column in updated) if updated else "NOTHING"
+        )
+        for chunk in chunked(rows, chunk_size):
+            copy_chunk(connection, staging, columns, chunk)
+            connection.exec_driver_sql(merge)
+            connection.exec_driver_sql("TRUNCATE " + staging.name)
+            count += len(chunk)
+        return count
+    stmt = (postgresql.insert if connection.dialect.name == "postgresql" else sqlite.insert)(table)
+    if updated:
+        stmt = stmt.on_conflict_do_update(index_elements=list(conflict), set_={column: stmt.excluded[column] for column in updated})
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=list(conflict))
+    for chunk in chunked(rows, chunk_size):
+        connection.execute(stmt, [dict(zip(columns, row)) for row in chunk])
+        count += len(chunk)
+    return count
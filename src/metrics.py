@@ -0,0 +1,207 @@
+"""
+Per-request performance instrumentation.
+
+Every request records its SQL statement count and time (from engine
+events, so primary and replica alike), the time spent encoding JSON and
+the response size. They are sent back as a Server-Timing header and
+aggregated per endpoint for GET /metrics (Prometheus text format),
+together with the response cache and connection pool stats.
+
+    SLOW_QUERY_MS   log statements slower than this (unset: off). Bound
+                    parameters are logged as their types, never their values.
+
+The numbers are per process: with several gunicorn workers each one keeps
+its own, so scrape them per worker or sum them up.
+"""
+import logging
+import os
+import threading
+import time
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS")) if os.getenv("SLOW_QUERY_MS") else None
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+slow_query_log = logging.getLogger("slow_query")
+
+def redact(parameters):
+    if isinstance(parameters, dict):
+        return {key: type(value).__name__ for key, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [redact(value) if isinstance(value, (dict, list, tuple)) else type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+@event.listens_for(Engine, "before_cursor_execute")
+def start_query_timer(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+@event.listens_for(Engine, "after_cursor_execute")
+def stop_query_timer(conn, cursor, statement, parameters, context, executemany):
+    elapsed = time.perf_counter() - conn.info["query_start"].pop()
+    if has_request_context():
+        g.sql_count = g.get("sql_count", 0) + 1
+        g.sql_seconds = g.get("sql_seconds", 0.0) + elapsed
+    if SLOW_QUERY_MS is not None and elapsed * 1000 >= SLOW_QUERY_MS:
+        slow_query_log.warning(
+            "%.1fms %s%s params=%s",
+            elapsed * 1000,
+            "(executemany) " if executemany else "",
+            " ".join(statement.split()),
+            redact(parameters)
+        )
+
+def timed_provider(provider_class):
+    # wraps whichever JSON provider the app uses; jsonify() goes through
+    # response(), the streaming views through dumps()
+
+    class TimedJSONProvider(provider_class):
+
+        def dumps(self, obj, **kwargs):
+            return self.timed(super().dumps, obj, **kwargs)
+
+        def response(self, *args, **kwargs):
+            return self.timed(super().response, *args, **kwargs)
+
+        def timed(self, encode, *args, **kwargs):
+            # the stdlib provider's response() calls dumps(): count it once
+            if not has_request_context() or g.get("encoding"):
+                return encode(*args, **kwargs)
+            g.encoding = True
+            start = time.perf_counter()
+            try:
+                return encode(*args, **kwargs)
+            finally:
+                g.encoding = False
+                g.serialize_seconds = g.get("serialize_seconds", 0.0) + time.perf_counter() - start
+
+    return TimedJSONProvider
+
+class RequestMetrics:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.endpoints = {}
+
+    def observe(self, endpoint, method, status, seconds, sql_count, sql_seconds, serialize_seconds, size):
+        with self.lock:
+            stats = self.endpoints.get((endpoint, method))
+            if stats is None:
+                stats = self.endpoints[(endpoint, method)] = {
+                    "statuses": {},
+                    "buckets": [0] * len(DURATION_BUCKETS),
+                    "seconds": 0.0,
+                    "sql_count": 0,
+                    "sql_seconds": 0.0,
+                    "serialize_seconds": 0.0,
+                    "response_bytes": 0,
+                }
+            stats["statuses"][status] = stats["statuses"].get(status, 0) + 1
+            for index, bound in enumerate(DURATION_BUCKETS):
+                if seconds <= bound:
+                    stats["buckets"][index] += 1
+            stats["seconds"] += seconds
+            stats["sql_count"] += sql_count
+            stats["sql_seconds"] += sql_seconds
+            stats["serialize_seconds"] += serialize_seconds
+            stats["response_bytes"] += size
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                key: dict(stats, statuses=dict(stats["statuses"]), buckets=list(stats["buckets"]))
+                for key, stats in self.endpoints.items()
+            }
+
+request_metrics = RequestMetrics()
+
+def label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+def render_metrics(cache_stats, pool_stats):
+    lines = []
+
+    def metric(name, kind, help, samples):
+        # samples: (suffix, labels, value); histograms use the _bucket/_sum/_count suffixes
+        lines.append("# HELP %s %s" % (name, help))
+        lines.append("# TYPE %s %s" % (name, kind))
+        for suffix, labels, value in samples:
+            text = ",".join('%s="%s"' % (key, label(item)) for key, item in labels)
+            lines.append("%s%s{%s} %s" % (name, suffix, text, value) if text else "%s%s %s" % (name, suffix, value))
+
+    endpoints = sorted(request_metrics.snapshot().items(), key=lambda item: item[0])
+    metric("http_requests_total", "counter", "Requests by endpoint, method and status.", [
+        ("", (("endpoint", endpoint), ("method", method), ("status", status)), count)
+        for (endpoint, method), stats in endpoints for status, count in sorted(stats["statuses"].items())
+    ])
+    duration = []
+    for (endpoint, method), stats in endpoints:
+        labels = (("endpoint", endpoint), ("method", method))
+        count = sum(stats["statuses"].values())
+        duration += [("_bucket", labels + (("le", bound),), hits) for bound, hits in zip(DURATION_BUCKETS, stats["buckets"])]
+        duration += [
+            ("_bucket", labels + (("le", "+Inf"),), count),
+            ("_sum", labels, stats["seconds"]),
+            ("_count", labels, count),
+        ]
+    metric("http_request_duration_seconds", "histogram", "Request latency.", duration)
+    for name, key, help in (
+        ("db_statements_total", "sql_count", "SQL statements executed."),
+        ("db_seconds_total", "sql_seconds", "Time spent in SQL statements."),
+        ("serialize_seconds_total", "serialize_seconds", "Time spent encoding JSON."),
+        ("response_bytes_total", "response_bytes", "Response body bytes (streamed bodies excluded)."),
+    ):
+        metric(name, "counter", help, [
+            ("", (("endpoint", endpoint), ("method", method)), stats[key]) for (endpoint, method), stats in endpoints
+        ])
+
+    for name, kind, help, value in (
+        ("response_cache_hits_total", "counter", "Response cache hits.", cache_stats["hits"]),
+        ("response_cache_misses_total", "counter", "Response cache misses.", cache_stats["misses"]),
+        ("response_cache_evictions_total", "counter", "Response cache evictions.", cache_stats["evictions"]),
+        ("response_cache_entries", "gauge", "Responses currently cached.", cache_stats["size"]),
+        ("db_pool_checkouts_total", "counter", "Connections checked out of the pool.", pool_stats["checkouts"]),
+        ("db_pool_wait_seconds_total", "counter", "Time spent waiting for a pooled connection.", pool_stats["wait_seconds_total"]),
+        ("db_pool_wait_seconds_max", "gauge", "Longest wait for a pooled connection.", pool_stats["wait_seconds_max"]),
+        ("db_pool_timeouts_total", "counter", "Checkouts that gave up waiting.", pool_stats["timeouts"]),
+    ):
+        metric(name, kind, help, [("", (), value)])
+    return "\n".join(lines) + "\n"
+
+def server_timing():
+    sql_count = g.get("sql_count", 0)
+    return ", ".join([
+        'db;dur=%.2f;desc="%d queries"' % (g.get("sql_seconds", 0.0) * 1000, sql_count),
+        "serialize;dur=%.2f" % (g.get("serialize_seconds", 0.0) * 1000),
+        "total;dur=%.2f" % ((time.perf_counter() - g.request_start) * 1000),
+    ])
+
+def setup_metrics(app):
+    app.json = timed_provider(type(app.json))(app)
+
+    @app.before_request
+    def start_request_timer():
+        g.request_start = time.perf_counter()
+        g.sql_count = 0
+        g.sql_seconds = 0.0
+        g.serialize_seconds = 0.0
+
+    @app.after_request
+    def record_request(response):
+        if "request_start" not in g:
+            return response
+        response.headers["Server-Timing"] = server_timing()
+        # the rule, not the path: /planets/<int:id> is one series, not one per id
+        endpoint = request.url_rule.rule if request.url_rule is not None else "unmatched"
+        request_metrics.observe(
+            endpoint,
+            request.method,
+            response.status_code,
+            time.perf_counter() - g.request_start,
+            g.get("sql_count", 0),
+            g.get("sql_seconds", 0.0),
+            g.get("serialize_seconds", 0.0),
+            0 if response.is_streamed else response.calculate_content_length() or 0
+        )
+        return response
@@ -1,30 +1,54 @@
 from flask import Flask
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import String, Boolean, Integer, BigInteger, ForeignKey
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import String, Boolean, Integer, BigInteger, ForeignKey, Index, UniqueConstraint, func, select, update
+from sqlalchemy.orm import Mapped, mapped_column, relationship, load_only
+from database import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={"class_": RoutingSession})
 
 class Users(db.Model):
     __tablename__ = "users"
+    serialize_columns = ("id", "name", "email", "is_active")
+    serialize_aggregates = ("favorite_count",)
+    # left out of the summary unless asked for with ?embed= (or ?fields=)
+    serialize_relations = ("favorites",)
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     email: Mapped[str] = mapped_column(String(120), unique=True, nullable=False)
     password: Mapped[str] = mapped_column(nullable=False)
     is_active: Mapped[bool] = mapped_column(Boolean(), nullable=False)
-    favorites: Mapped[list["Favorites"]] = relationship(back_populates="user", cascade="all, delete-orphan")
-
-    def serialize(self):
-        return {
+    # bumped with every change to this user's favorites; keys favorites_cache
+    favorites_version: Mapped[int] = mapped_column(BigInteger(), nullable=False, default=0, server_default="0")
+    favorites: Mapped[list["Favorites"]] = relationship(back_populates="user", cascade="all, delete-orphan", order_by="Favorites.id")
+
+    @classmethod
+    def loader_options(cls, fields=None):
+        # favorites come from favorites_cache.user_favorites(), not the relationship
+        if fields is None:
+            return []
+        # id and favorites_version always: they key the favorites and the page cursor
+        columns = [getattr(cls, name) for name in cls.serialize_columns if name in fields or name == "id"]
+        return [load_only(*columns, cls.favorites_version)]
+
+    def serialize(self, fields=None, favorite_count=None, favorites=None):
+        data = {
             "id": self.id,
             "name": self.name,
             "email": self.email,
             "is_active": self.is_active,
-            "favorites": [favorite.serialize() for favorite in self.favorites]
-        }
+        } if fields is None else {name: getattr(self, name) for name in self.serialize_columns if name in fields}
+        if favorite_count is not None:
+            data["favorite_count"] = favorite_count
+        if favorites is not None:
+            data["favorites"] = favorites
+        return data
     
 class Favorites(db.Model):
     __tablename__ = "favorites"
+    __table_args__ = (
+        UniqueConstraint("user_id", "item_type", "item_id", name="uq_favorites_user_item"),
+        Index("ix_favorites_item", "item_type", "item_id"),
+    )
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"), nullable=False)
     item_id: Mapped[int] = mapped_column(nullable=False)
@@ -41,9 +65,41 @@ class Favorites(db.Model):
             "item_id": self.item_id,
             "item_name": self.item_name
         }
-    
+
+def favorited_by_map(item_type, item_ids, session=None):
+    # one query for the whole page instead of one per item (and one per user)
+    session = db.session if session is None else session
+    favorited_by = {item_id: [] for item_id in item_ids}
+    if not favorited_by:
+        return favorited_by
+    stmt = select(Favorites.item_id, Users.name).join(Users, Favorites.user_id == Users.id).where(
+        Favorites.item_type == item_type,
+        Favorites.item_id.in_(list(favorited_by))
+    ).order_by(Favorites.id)
+    for item_id, name in session.execute(stmt):
+        favorited_by[item_id].append(name)
+    return favorited_by
+
+def user_favorite_counts(user_ids, session=None):
+    # one GROUP BY for the whole page; users without favorites get 0
+    session = db.session if session is None else session
+    counts = {user_id: 0 for user_id in user_ids}
+    if not counts:
+        return counts
+    stmt = select(Favorites.user_id, func.count(Favorites.id)).where(
+        Favorites.user_id.in_(list(counts))
+    ).group_by(Favorites.user_id)
+    for user_id, count in session.execute(stmt):
+        counts[user_id] = count
+    return counts
+
 class People(db.Model):
     __tablename__ = "people"
+    favorite_type = "person"
+    serialize_columns = ("id", "name", "gender", "skin_color", "hair_color", "height", "eye_color", "mass")
+    serialize_relations = ("species", "homeworld")
+    filter_columns = ("name", "gender", "skin_color", "hair_color", "height", "eye_color", "mass", "species_id", "homeworld_id")
+    sort_columns = ("name", "height", "mass")
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     gender: Mapped[str] = mapped_column(String(120), nullable=True)
@@ -52,37 +108,23 @@ class People(db.Model):
     height: Mapped[int] = mapped_column(Integer(), nullable=True)
     eye_color: Mapped[str] = mapped_column(String(120), nullable=True)
     mass: Mapped[int] = mapped_column(Integer(), nullable=True)
+    favorite_count: Mapped[int] = mapped_column(Integer(), nullable=False, default=0, server_default="0")
 
-    species_id: Mapped[int] = mapped_column(ForeignKey("species.id"), nullable=True)
+    species_id: Mapped[int] = mapped_column(ForeignKey("species.id"), nullable=True, index=True)
     species: Mapped["Species"] = relationship(back_populates="members")
 
-    homeworld_id: Mapped[int] = mapped_column(ForeignKey("planets.id"), nullable=True)
+    homeworld_id: Mapped[int] = mapped_column(ForeignKey("planets.id"), nullable=True, index=True)
     homeworld: Mapped["Planets"] = relationship(back_populates="residents")
 
-    def serialize(self):
-        from models import db, Favorites
-        favorites = db.session.query(Favorites).filter_by(
-            item_type="person",
-            item_id=self.id
-        ).all()
-        favorited_by = [fav.user.name for fav in favorites if fav.user]
-
-        return {
-            "id": self.id,
-            "name": self.name,
-            "gender": self.gender,
-            "skin_color": self.skin_color,
-            "hair_color": self.hair_color,
-            "height": self.height,
-            "eye_color": self.eye_color,
-            "mass": self.mass,
-            "species": self.species.name if self.species else None,
-            "homeworld": self.homeworld.name if self.homeworld else None,
-            "favorited_by": favorited_by
-        }
-
 class Planets(db.Model):
     __tablename__ = "planets"
+    favorite_type = "planet"
+    serialize_columns = ("id", "name", "climate", "surface_water", "diameter", "gravity", "orbital_period", "population")
+    serialize_relations = ("residents", "fauna")
+    # related id lists PUT /planets/<id> accepts, see schemas.InputSchema
+    writable_relations = {"fauna_ids": "fauna", "residents_ids": "residents"}
+    filter_columns = ("name", "climate", "surface_water", "diameter", "gravity", "orbital_period", "population")
+    sort_columns = ("name", "surface_water", "diameter", "orbital_period", "population")
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     climate:  Mapped[str] = mapped_column(String(120), nullable=True)
@@ -91,33 +133,19 @@ class Planets(db.Model):
     gravity: Mapped[str] = mapped_column(String(120), nullable=True)
     orbital_period: Mapped[int] = mapped_column(Integer(), nullable=True)
     population: Mapped[int] = mapped_column(BigInteger(), nullable=True)
+    favorite_count: Mapped[int] = mapped_column(Integer(), nullable=False, default=0, server_default="0")
     
-    residents: Mapped[list["People"]] = relationship(back_populates="homeworld")
-    fauna: Mapped[list["Species"]] = relationship(back_populates="homeworld")
-
-    def serialize(self):
-        from models import db, Favorites
-        favorites = db.session.query(Favorites).filter_by(
-            item_type="planet",
-            item_id=self.id
-        ).all()
-        favorited_by = [fav.user.name for fav in favorites if fav.user]
-        return {
-            "id": self.id,
-            "name": self.name,
-            "climate": self.climate,
-            "surface_water": self.surface_water,
-            "diameter": self.diameter,
-            "gravity": self.gravity,
-            "orbital_period": self.orbital_period,
-            "population": self.population,
-            "residents": [resident.name for resident in self.residents] if self.residents else None,
-            "fauna": [species.name for species in self.fauna] if self.fauna else None,
-            "favorited_by": favorited_by
-        }
+    residents: Mapped[list["People"]] = relationship(back_populates="homeworld", order_by="People.id")
+    fauna: Mapped[list["Species"]] = relationship(back_populates="homeworld", order_by="Species.id")
 
 class Species(db.Model):
     __tablename__ = "species"
+    favorite_type = "species"
+    serialize_columns = ("id", "name", "classification", "designation", "eye_colors", "skin_colors", "language", "hair_colors", "average_lifespan", "average_height")
+    serialize_relations = ("homeworld", "members")
+    writable_relations = {"members_ids": "members"}
+    filter_columns = ("name", "classification", "designation", "language", "average_lifespan", "average_height", "homeworld_id")
+    sort_columns = ("name", "average_lifespan", "average_height")
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     classification: Mapped[str] = mapped_column(String(120), nullable=True)
@@ -128,37 +156,20 @@ class Species(db.Model):
     hair_colors: Mapped[str] = mapped_column(String(120), nullable=True)
     average_lifespan:  Mapped[int] = mapped_column(Integer(), nullable=True)
     average_height:  Mapped[int] = mapped_column(Integer(), nullable=True)
+    favorite_count: Mapped[int] = mapped_column(Integer(), nullable=False, default=0, server_default="0")
     
-    homeworld_id: Mapped[int] = mapped_column(ForeignKey("planets.id"), nullable=True)
+    homeworld_id: Mapped[int] = mapped_column(ForeignKey("planets.id"), nullable=True, index=True)
     homeworld: Mapped["Planets"] = relationship(back_populates="fauna")
 
-    members: Mapped[list["People"]] = relationship(back_populates="species")
-
-    def serialize(self):
-        from models import db, Favorites
-        favorites = db.session.query(Favorites).filter_by(
-            item_type="species",
-            item_id=self.id
-        ).all()
-        favorited_by = [fav.user.name for fav in favorites if fav.user]
-        return {
-            "id": self.id,
-            "name": self.name,
-            "classification": self.classification,
-            "designation": self.designation,
-            "eye_colors": self.eye_colors,
-            "skin_colors": self.skin_colors,
-            "language": self.language,
-            "hair_colors": self.hair_colors,
-            "average_lifespan": self.average_lifespan,
-            "average_height": self.average_height,
-            "homeworld": self.homeworld.name if self.homeworld else None,
-            "members": [member.name for member in self.members] if self.members else None,
-            "favorited_by": favorited_by
-        }
+    members: Mapped[list["People"]] = relationship(back_populates="species", order_by="People.id")
 
 class Vehicles(db.Model):
     __tablename__ = "vehicles"
+    favorite_type = "vehicle"
+    serialize_columns = ("id", "name", "consumables", "cargo_capacity", "max_atmosphering_speed", "crew", "length", "model", "vehicle_class")
+    serialize_relations = ()
+    filter_columns = ("name", "consumables", "cargo_capacity", "max_atmosphering_speed", "crew", "length", "model", "vehicle_class")
+    sort_columns = ("name", "cargo_capacity", "max_atmosphering_speed", "crew", "length")
     id: Mapped[int] = mapped_column(primary_key=True)
     name: Mapped[str] = mapped_column(String(120), nullable=False)
     consumables: Mapped[str] = mapped_column(String(120), nullable=True)
@@ -168,24 +179,50 @@ class Vehicles(db.Model):
     length: Mapped[int] = mapped_column(Integer(), nullable=True)
     model: Mapped[str] = mapped_column(String(120), nullable=True)
     vehicle_class: Mapped[str] = mapped_column(String(120), nullable=True)
-
-    def serialize(self):
-        from models import db, Favorites
-        favorites = db.session.query(Favorites).filter_by(
-            item_type="vehicle",
-            item_id=self.id
-        ).all()
-        favorited_by = [fav.user.name for fav in favorites if fav.user]
-        return {
-            "id": self.id,
-            "name": self.name,
-            "consumables": self.consumables,
-            "cargo_capacity": self.cargo_capacity,
-            "max_atmosphering_speed": self.max_atmosphering_speed,
-            "crew": self.crew,
-            "length": self.length,
-            "model": self.model,
-            "vehicle_class": self.vehicle_class,
-            "favorited_by": favorited_by
-        }
-
+    favorite_count: Mapped[int] = mapped_column(Integer(), nullable=False, default=0, server_default="0")
+
+class TableVersions(db.Model):
+    # bumped in the same transaction as every write, see versions.py
+    __tablename__ = "table_versions"
+    table_name: Mapped[str] = mapped_column(String(64), primary_key=True)
+    version: Mapped[int] = mapped_column(BigInteger(), nullable=False, default=0)
+
+FAVORITE_MODELS = {model.favorite_type: model for model in (People, Planets, Species, Vehicles)}
+
+def change_favorite_count(item_type, item_ids, delta, execution_options=None):
+    # favorite_count on every favoritable model is kept in step with favorites
+    # by the favorite routes: an in-place increment in the caller's
+    # transaction, so concurrent favorites never overwrite each other's count
+    model = FAVORITE_MODELS[item_type]
+    db.session.execute(
+        update(model).where(model.id.in_(list(item_ids))).values(favorite_count=model.favorite_count + delta),
+        execution_options=execution_options or {},
+    )
+
+def reconcile_favorite_counts():
+    # recount from favorites and fix the rows that drifted; returns the fixes per type
+    fixed = {}
+    for item_type, model in FAVORITE_MODELS.items():
+        actual = select(func.count(Favorites.id)).where(
+            Favorites.item_type == item_type,
+            Favorites.item_id == model.id
+        ).scalar_subquery()
+        result = db.session.execute(
+            update(model).where(model.favorite_count != actual).values(favorite_count=actual)
+        )
+        fixed[item_type] = result.rowcount
+    db.session.commit()
+    return fixed
+
+for model in FAVORITE_MODELS.values():
+    # case-insensitive ?name_prefix= lookups, see search.py
+    Index(
+        "ix_%s_name_lower" % model.__tablename__,
+        func.lower(model.name).label("name_lower"),
+        postgresql_ops={"name_lower": "text_pattern_ops"}
+    )
+    # GET /favorites/top reads this index from the top, no sort
+    Index("ix_%s_favorite_count" % model.__tablename__, model.favorite_count.desc(), model.id)
+    # ?sort= pages walk (column, id) in either direction, see utils.sorted_page()
+    for name in model.sort_columns:
+        Index("ix_%s_%s_id" % (model.__tablename__, name), getattr(model, name), model.id)
@@ -0,0 +1,93 @@
+"""
+Read-only listing straight from column rows, without hydrating ORM objects.
+Rows become response schemas (schemas.py), which the JSON provider encodes
+as objects with sorted keys.
+"""
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from sqlalchemy.orm.interfaces import MANYTOONE
+from models import db, favorited_by_map, user_favorite_counts
+from favorites_cache import user_favorites
+from schemas import serializable_fields, build_responses
+from utils import APIException
+
+def parse_fields(model, args):
+    # ?fields=id,name -> {"id", "name"}; None means every field
+    if "fields" not in args:
+        return None
+    fields = {name.strip() for name in args["fields"].split(",") if name.strip()}
+    unknown = fields.difference(serializable_fields(model))
+    if not fields or unknown:
+        raise APIException("Invalid fields: " + ", ".join(sorted(unknown)), payload={
+            "allowed": list(serializable_fields(model))
+        })
+    return fields
+
+def parse_embed(model, args):
+    # ?embed=favorites -> {"favorites"}: relations the summary leaves out
+    embed = {name.strip() for name in args.get("embed", "").split(",") if name.strip()}
+    unknown = embed.difference(model.serialize_relations)
+    if unknown:
+        raise APIException("Invalid embed: " + ", ".join(sorted(unknown)), payload={
+            "allowed": list(model.serialize_relations)
+        })
+    return embed
+
+def wanted(fields, name):
+    return fields is None or name in fields
+
+def projection_query(model, fields=None, sort=None):
+    # id (and the sort column) are always selected: they key the page cursor
+    # and the related-name lookups
+    keys = {"id"} if sort is None else {"id", sort[0].key}
+    columns = [getattr(model, name) for name in model.serialize_columns if name in keys or wanted(fields, name)]
+    stmt = select(*columns)
+    for name in model.serialize_relations:
+        relation = getattr(model, name)
+        if relation.property.direction is MANYTOONE and wanted(fields, name):
+            target = aliased(relation.property.mapper.class_)
+            stmt = stmt.outerjoin(relation.of_type(target)).add_columns(target.name.label(name))
+    return stmt
+
+def related_names(relation, ids, session):
+    # one query per collection for the whole page, e.g. residents of every planet
+    target = relation.property.mapper.class_
+    foreign_key = next(iter(relation.property.remote_side))
+    names = {item_id: [] for item_id in ids}
+    stmt = select(foreign_key, target.name).where(foreign_key.in_(ids)).order_by(target.id)
+    for item_id, name in session.execute(stmt):
+        names[item_id].append(name)
+    return names
+
+def project_rows(model, rows, fields=None, session=None):
+    session = db.session if session is None else session
+    rows = list(rows)
+    if not rows:
+        return []
+    ids = [row.id for row in rows]
+    extras = {}
+    for name in model.serialize_relations:
+        relation = getattr(model, name)
+        if relation.property.direction is MANYTOONE or not wanted(fields, name):
+            continue
+        extras[name] = {item_id: names or None for item_id, names in related_names(relation, ids, session).items()}
+    if wanted(fields, "favorited_by"):
+        extras["favorited_by"] = favorited_by_map(model.favorite_type, ids, session)
+    return build_responses(model, rows, fields, extras)
+
+def project_item(model, id, fields=None):
+    row = db.session.execute(projection_query(model, fields).where(model.id == id)).one_or_none()
+    return None if row is None else project_rows(model, [row], fields)[0]
+
+def serialize_users(users, fields=None, embed=(), session=None, store=None):
+    # summary by default: favorite_count from one aggregate query, favorites
+    # (from favorites_cache) only with ?embed=favorites or ?fields=favorites
+    ids = [user.id for user in users]
+    embedded = "favorites" in embed or (fields is not None and "favorites" in fields)
+    favorites = {}
+    if embedded:
+        favorites = user_favorites(ids, session, store, {user.id: user.favorites_version for user in users})
+    counts = {}
+    if wanted(fields, "favorite_count"):
+        counts = {id: len(rows) for id, rows in favorites.items()} if embedded else user_favorite_counts(ids, session)
+    return [user.serialize(fields, counts.get(user.id), favorites.get(user.id)) for user in users]
@@ -0,0 +1,161 @@
+"""
+Response dataclasses and input checks generated once from the reference
+models. Response fields are in sorted order, so bodies stay byte for byte
+what the dict version produced (ETags, cached responses).
+"""
+import dataclasses
+from functools import cache
+from operator import itemgetter
+from sqlalchemy import Boolean, Integer, String, select
+from models import db
+from loading import chunked
+from utils import APIException
+
+LOOKUP_CHUNK_SIZE = 500
+
+def serializable_fields(model):
+    fields = model.serialize_columns + getattr(model, "serialize_aggregates", ()) + model.serialize_relations
+    if hasattr(model, "favorite_type"):
+        fields += ("favorited_by",)
+    return fields
+
+@cache
+def response_schema(model, fields=None):
+    # fields: a frozenset, or None for every field. Sorted, as orjson writes
+    # dataclass fields in declaration order even with OPT_SORT_KEYS; not
+    # slotted, as it encodes from __dict__ far faster than through __slots__
+    names = sorted(name for name in serializable_fields(model) if fields is None or name in fields)
+    return dataclasses.make_dataclass(model.__name__ + "Response", names)
+
+def build_responses(model, rows, fields, extras):
+    """rows: projection rows; extras: {field: {id: value}} for what the rows lack."""
+    schema = response_schema(model, None if fields is None else frozenset(fields))
+    columns = rows[0]._fields
+    lookups = list(extras.items())
+    sources = list(columns) + [name for name, _ in lookups]
+    positions = [sources.index(field.name) for field in dataclasses.fields(schema)]
+    pick = itemgetter(*positions) if len(positions) > 1 else lambda values: (values[positions[0]],)
+    return [
+        schema(*pick(tuple(row) + tuple(values[row.id] for _, values in lookups)))
+        for row in rows
+    ]
+
+def writable_columns(model):
+    # favorite_count and favorites_version belong to the favorite routes, not to clients
+    return {
+        column.key: column for column in model.__table__.columns
+        if not column.primary_key and column.key not in ("favorite_count", "favorites_version")
+    }
+
+def check_value(column, value):
+    if value is None:
+        return None if column.nullable else "may not be null"
+    if isinstance(column.type, Boolean):
+        if not isinstance(value, bool):
+            return "must be a boolean"
+    elif isinstance(column.type, Integer):
+        if isinstance(value, bool) or not isinstance(value, int):
+            return "must be an integer"
+    elif isinstance(column.type, String):
+        if not isinstance(value, str):
+            return "must be a string"
+        if column.type.length and len(value) > column.type.length:
+            return "must be at most %d characters" % column.type.length
+    return None
+
+def check_ids(value):
+    if value is None:
+        return None
+    if not isinstance(value, list) or any(isinstance(id, bool) or not isinstance(id, int) for id in value):
+        return "must be a list of integer ids"
+    return None
+
+def existing_ids(column, ids):
+    found = set()
+    for chunk in chunked(ids, LOOKUP_CHUNK_SIZE):
+        found.update(db.session.scalars(select(column).where(column.in_(chunk))))
+    return found
+
+class InputSchema:
+
+    def __init__(self, model, relations=False):
+        self.model = model
+        self.columns = writable_columns(model)
+        # field -> model of the related ids, only for the single create/update routes
+        self.relations = {
+            field: getattr(model, name).property.mapper.class_
+            for field, name in getattr(model, "writable_relations", {}).items()
+        } if relations else {}
+        self.references = [("id", model.id)] + [
+            (foreign_key.parent.key, foreign_key.column) for foreign_key in model.__table__.foreign_keys
+        ]
+
+    def item_errors(self, item):
+        if not isinstance(item, dict):
+            return {"item": "must be an object"}
+        errors = {}
+        for key, value in item.items():
+            if key == "id":
+                if isinstance(value, bool) or not isinstance(value, int):
+                    errors["id"] = "must be an integer"
+            elif key in self.relations:
+                message = check_ids(value)
+                if message:
+                    errors[key] = message
+            elif key not in self.columns:
+                errors[key] = "unknown field"
+            else:
+                message = check_value(self.columns[key], value)
+                if message:
+                    errors[key] = message
+        # creates need the non-nullable columns; updates (with an id) are partial
+        if "id" not in item:
+            for key, column in self.columns.items():
+                if key not in item and not column.nullable and column.server_default is None:
+                    errors[key] = "is required"
+        return errors
+
+    def validate(self, items):
+        """Per-item errors for a whole batch, foreign keys checked with one lookup per table."""
+        errors = {}
+        for index, item in enumerate(items):
+            item_errors = self.item_errors(item)
+            if item_errors:
+                errors[index] = item_errors
+        valid = [(index, item) for index, item in enumerate(items) if index not in errors]
+        for key, column in self.references:
+            wanted = {item[key] for _, item in valid if item.get(key) is not None}
+            missing = wanted - existing_ids(column, wanted)
+            for index, item in valid:
+                if item.get(key) in missing:
+                    errors.setdefault(index, {})[key] = "not found"
+        for key, related in self.relations.items():
+            wanted = {id for _, item in valid for id in item.get(key) or ()}
+            missing = wanted - existing_ids(related.id, wanted)
+            for index, item in valid:
+                not_found = [id for id in item.get(key) or () if id in missing]
+                if not_found:
+                    errors.setdefault(index, {})[key] = "not found: " + ", ".join(map(str, not_found))
+        return [{"index": index, "errors": item_errors} for index, item_errors in sorted(errors.items())]
+
+@cache
+def input_schema(model, relations=False):
+    return InputSchema(model, relations)
+
+def check_input(model, data, id=None):
+    """Validate a create (no id) or update payload; returns the values to set, related id lists deduplicated."""
+    if not isinstance(data, dict):
+        raise APIException("Expected a JSON object")
+    if "id" in data:
+        raise APIException("Invalid data", payload={"errors": {"id": "is read-only"}})
+    # related ids are set by the update routes; creates take columns only
+    schema = input_schema(model, relations=id is not None)
+    item = data if id is None else dict(data, id=id)
+    errors = schema.validate([item])
+    if errors:
+        raise APIException("Invalid data", payload={"errors": errors[0]["errors"]})
+    values = dict(data)
+    for key in schema.relations:
+        if values.get(key) is not None:
+            values[key] = list(dict.fromkeys(values[key]))
+    return values
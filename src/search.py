@@ -0,0 +1,126 @@
+"""
+Name search over people, planets, species and vehicles.
+
+PostgreSQL: GIN indexes on to_tsvector('simple', name) (word prefixes,
+ts_rank) and on name gin_trgm_ops (fuzzy, similarity()).
+SQLite: one FTS5 table, search_index, kept in sync by triggers. Its rowid
+packs the item id and type (id * 4 + type), so the triggers and the result
+lookup never scan.
+
+The migration creates all of this; the DDL below does the same for
+db.create_all() (`flask data import --replace`, `flask data generate`).
+"""
+import re
+from sqlalchemy import DDL, and_, event, func, text
+from models import db, FAVORITE_MODELS
+
+SEARCH_TYPES = ("person", "planet", "species", "vehicle")
+MAX_SEARCH_OFFSET = 1000
+
+def sqlite_search_statements(item_type):
+    # the triggers of one table, keyed by event, and the backfill of its existing rows
+    code = SEARCH_TYPES.index(item_type)
+    table = FAVORITE_MODELS[item_type].__tablename__
+    rowid = "%s.id * 4 + " + str(code)
+    return {
+        "insert": "CREATE TRIGGER IF NOT EXISTS %s_search_insert AFTER INSERT ON %s BEGIN "
+                  "INSERT INTO search_index (rowid, name) VALUES (%s, new.name); END" % (table, table, rowid % "new"),
+        "update": "CREATE TRIGGER IF NOT EXISTS %s_search_update AFTER UPDATE OF name ON %s BEGIN "
+                  "UPDATE search_index SET name = new.name WHERE rowid = %s; END" % (table, table, rowid % "new"),
+        "delete": "CREATE TRIGGER IF NOT EXISTS %s_search_delete AFTER DELETE ON %s BEGIN "
+                  "DELETE FROM search_index WHERE rowid = %s; END" % (table, table, rowid % "old"),
+        "backfill": "INSERT INTO search_index (rowid, name) SELECT id * 4 + %d, name FROM %s" % (code, table),
+    }
+
+def sqlite_search_ddl():
+    statements = [
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(name, prefix='2 3')",
+    ]
+    for item_type in SEARCH_TYPES:
+        statements += sqlite_search_statements(item_type).values()
+    return statements
+
+def postgresql_search_indexes(table):
+    # index name -> CREATE INDEX statement, for one table
+    return {
+        "ix_%s_name_tsv" % table: "CREATE INDEX IF NOT EXISTS ix_%s_name_tsv ON %s USING gin (to_tsvector('simple', name))" % (table, table),
+        "ix_%s_name_trgm" % table: "CREATE INDEX IF NOT EXISTS ix_%s_name_trgm ON %s USING gin (name gin_trgm_ops)" % (table, table),
+    }
+
+def postgresql_search_ddl():
+    statements = ["CREATE EXTENSION IF NOT EXISTS pg_trgm"]
+    for item_type in SEARCH_TYPES:
+        statements += postgresql_search_indexes(FAVORITE_MODELS[item_type].__tablename__).values()
+    return statements
+
+@event.listens_for(db.metadata, "after_create")
+def create_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        statements = sqlite_search_ddl()
+    elif connection.dialect.name == "postgresql":
+        statements = postgresql_search_ddl()
+    else:
+        return
+    for statement in statements:
+        connection.execute(DDL(statement))
+
+@event.listens_for(db.metadata, "before_drop")
+def drop_search_index(target, connection, **kw):
+    if connection.dialect.name == "sqlite":
+        connection.execute(DDL("DROP TABLE IF EXISTS search_index"))
+
+def exclude_search_tables(object, name, type_, reflected, compare_to):
+    # autogenerate must not drop the FTS5 table (and its shadow tables)
+    return not (type_ == "table" and reflected and name.startswith("search_index"))
+
+def terms(q):
+    return re.findall(r"\w+", q.lower())
+
+def search(q, types=SEARCH_TYPES, limit=20, offset=0):
+    words = terms(q)
+    if not words:
+        return []
+    session = db.session
+    if session.get_bind().dialect.name == "postgresql":
+        return search_postgresql(session, q, words, types, limit, offset)
+    return search_sqlite(session, words, types, limit, offset)
+
+def search_sqlite(session, words, types, limit, offset):
+    # every word must match, the last one as a prefix ("luk sky" finds Luke Skywalker)
+    match = " ".join('"%s"' % word for word in words[:-1]) + ' "%s"*' % words[-1]
+    codes = [SEARCH_TYPES.index(item_type) for item_type in types]
+    stmt = text(
+        "SELECT rowid, name, -rank AS score FROM search_index "
+        "WHERE search_index MATCH :match AND rowid %% 4 IN (%s) "
+        "ORDER BY rank LIMIT :limit OFFSET :offset" % ", ".join(map(str, codes))
+    )
+    rows = session.execute(stmt, {"match": match.strip(), "limit": limit, "offset": offset})
+    return [
+        {"type": SEARCH_TYPES[rowid % 4], "id": rowid // 4, "name": name, "rank": score}
+        for rowid, name, score in rows
+    ]
+
+def search_postgresql(session, q, words, types, limit, offset):
+    tsquery = " & ".join(word + ":*" for word in words)
+    selects = [
+        "SELECT '%s' AS type, id, name, "
+        "ts_rank(to_tsvector('simple', name), to_tsquery('simple', :tsquery)) + similarity(name, :q) AS rank "
+        "FROM %s WHERE to_tsvector('simple', name) @@ to_tsquery('simple', :tsquery) OR name %% :q"
+        % (item_type, FAVORITE_MODELS[item_type].__tablename__)
+        for item_type in types
+    ]
+    stmt = text(
+        "SELECT type, id, name, rank FROM (%s) AS hits "
+        "ORDER BY rank DESC, type, id LIMIT :limit OFFSET :offset" % " UNION ALL ".join(selects)
+    )
+    rows = session.execute(stmt, {"tsquery": tsquery, "q": q, "limit": limit, "offset": offset})
+    return [dict(row._mapping) for row in rows]
+
+def name_prefix_clause(model, prefix, dialect):
+    column = func.lower(model.name)
+    prefix = prefix.lower()
+    if dialect == "postgresql":
+        # LIKE 'x%' on lower(name) text_pattern_ops
+        return column.startswith(prefix, autoescape=True)
+    # SQLite only uses the lower(name) index for range comparisons
+    return and_(column >= prefix, column < prefix[:-1] + chr(ord(prefix[-1]) + 1))
@@ -0,0 +1,42 @@
+"""
+Incremental JSON array / NDJSON responses for whole collections.
+Rows come off a server-side cursor in chunks, so worker memory holds one
+chunk at a time whatever the table size.
+"""
+import os
+from flask import current_app, request, stream_with_context
+from models import db
+from projections import project_rows
+
+NDJSON = "application/x-ndjson"
+STREAM_CHUNK_SIZE = int(os.getenv("STREAM_CHUNK_SIZE", 1000))
+
+def wants_ndjson():
+    return request.accept_mimetypes.best_match(["application/json", NDJSON]) == NDJSON
+
+def wants_stream():
+    return request.args.get("stream") in ("1", "true") or wants_ndjson()
+
+def stream_rows(model, stmt, fields=None):
+    ndjson = wants_ndjson()
+    dumps = current_app.json.dumps
+
+    def generate():
+        result = db.session.execute(stmt.execution_options(yield_per=STREAM_CHUNK_SIZE))
+        if not ndjson:
+            yield "["
+        separator = ""
+        for rows in result.partitions():
+            encoded = [dumps(item, separators=(",", ":")) for item in project_rows(model, rows, fields)]
+            if ndjson:
+                yield "\n".join(encoded) + "\n"
+            else:
+                yield separator + ",".join(encoded)
+                separator = ","
+        if not ndjson:
+            yield "]\n"
+
+    return current_app.response_class(
+        stream_with_context(generate()),
+        mimetype=NDJSON if ndjson else "application/json"
+    )
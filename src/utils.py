@@ -1,4 +1,7 @@
+import base64
+import json
 from flask import jsonify, url_for
+from sqlalchemy import Integer, select, tuple_, union_all
 
 class APIException(Exception):
     status_code = 400
@@ -15,6 +18,100 @@ class APIException(Exception):
         rv['message'] = self.message
         return rv
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def encode_cursor(value, id):
+    return base64.urlsafe_b64encode(json.dumps([value, id]).encode()).decode().rstrip("=")
+
+def decode_cursor(cursor, column):
+    try:
+        value, id = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (TypeError, ValueError):
+        raise APIException("Invalid cursor")
+    value_type = int if isinstance(column.type, Integer) else str
+    if value is None and not column.nullable:
+        raise APIException("Invalid cursor")
+    if type(id) is not int or (value is not None and type(value) is not value_type):
+        raise APIException("Invalid cursor")
+    return value, id
+
+def sort_order(model, sort=None):
+    if sort is None:
+        return [model.id]
+    column, descending = sort
+    # id breaks ties, so (value, id) is unique and the keyset is stable; it
+    # runs the same way as the column, so one (column, id) index serves both
+    # directions. Nulls sort last whatever the direction.
+    if descending:
+        return [column.desc().nulls_last(), model.id.desc()]
+    return [column.asc().nulls_last(), model.id]
+
+def unindexed(column):
+    # the same value, as an expression SQLite won't pick an index for
+    return column + 0 if isinstance(column.type, Integer) else column.concat("")
+
+def sorted_page(stmt, model, sort, cursor, limit, prefix_search=False):
+    # the rows with a value, then the rows without: two range scans of the
+    # (column, id) index under one ORDER BY ... LIMIT. A single WHERE with
+    # "OR column IS NULL" would walk the index from its start on every page.
+    column, descending = sort
+    value, id = (None, None) if cursor is None else decode_cursor(cursor, column)
+    # a ?name_prefix= search runs on the lower(name) index instead
+    key_column, key_id = (unindexed(column), unindexed(model.id)) if prefix_search else (column, model.id)
+    parts = []
+    if cursor is None or value is not None:
+        valued = stmt.where(key_column.is_not(None)) if column.nullable else stmt
+        if value is not None:
+            key, past = tuple_(key_column, key_id), tuple_(value, id)
+            valued = valued.where(key < past if descending else key > past)
+        parts.append(valued.order_by(*[column.desc(), model.id.desc()] if descending else [column, model.id]))
+    if column.nullable:
+        nulls = stmt.where(key_column.is_(None))
+        if cursor is not None and value is None:
+            nulls = nulls.where(key_id < id if descending else key_id > id)
+        parts.append(nulls.order_by(model.id.desc() if descending else model.id))
+    if len(parts) == 1:
+        return parts[0].limit(limit + 1)
+    page = union_all(*[select(part.limit(limit + 1).subquery()) for part in parts]).subquery()
+    return select(page).order_by(*sort_order(page.c, (page.c[column.key], descending))).limit(limit + 1)
+
+def paginate(stmt, model, args, sort=None):
+    # keyset pagination on the primary key (or on (sort column, id)),
+    # so deep pages cost the same as page 1
+    after = args.get("after")
+    try:
+        limit = int(args.get("limit", DEFAULT_PAGE_SIZE))
+        if sort is None and after is not None:
+            after = int(after)
+    except ValueError:
+        raise APIException("limit and after must be integers")
+    if limit < 1:
+        raise APIException("limit must be greater than 0")
+    limit = min(limit, MAX_PAGE_SIZE)
+    if sort is not None:
+        return sorted_page(stmt, model, sort, after, limit, bool(args.get("name_prefix"))), limit
+    if after is not None:
+        # a ?name_prefix= search has to run on the lower(name) index,
+        # not on the rowid range
+        stmt = stmt.where((unindexed(model.id) if args.get("name_prefix") else model.id) > after)
+    # one extra row tells us whether there is a next page
+    return stmt.order_by(model.id).limit(limit + 1), limit
+
+def split_page(items, limit, sort=None):
+    if len(items) <= limit:
+        return items, None
+    items = items[:limit]
+    last = items[-1]
+    if sort is None:
+        return items, last.id
+    return items, encode_cursor(getattr(last, sort[0].key), last.id)
+
+def page_headers(next_cursor):
+    if next_cursor is None:
+        return {}
+    return {"X-Next-Cursor": str(next_cursor)}
+
 def has_no_empty_params(rule):
     defaults = rule.defaults if rule.defaults is not None else ()
     arguments = rule.arguments if rule.arguments is not None else ()
@@ -0,0 +1,94 @@
+"""
+Per-table version counters and the strong ETags derived from them.
+
+Every flush (and every ORM insert/update/delete executed through the
+session) records the tables it touched; the commit bumps each of their
+counters once, in the same transaction, so a GET can answer If-None-Match
+by reading one tiny table before fetching or serializing any rows.
+
+The bump locks that table's counter row until the commit ends, so writers
+to the same table queue on it. Bumping in before_commit keeps that wait to
+the commit itself instead of the whole transaction.
+"""
+import hashlib
+from functools import wraps
+from flask import current_app, g, make_response, request
+from sqlalchemy import event, insert, select, update
+from models import db, TableVersions
+
+def bump_versions(connection, tables):
+    # returns {table: new version}
+    tables = sorted(set(tables) - {TableVersions.__tablename__})
+    if not tables:
+        return {}
+    versions = dict(connection.execute(
+        update(TableVersions)
+        .where(TableVersions.table_name.in_(tables))
+        .values(version=TableVersions.version + 1)
+        .returning(TableVersions.table_name, TableVersions.version)
+    ).all())
+    missing = [table for table in tables if table not in versions]
+    if missing:
+        connection.execute(insert(TableVersions), [{"table_name": table, "version": 1} for table in missing])
+        versions.update(dict.fromkeys(missing, 1))
+    return versions
+
+def current_versions(tables, session=None):
+    session = db.session if session is None else session
+    stmt = select(TableVersions.table_name, TableVersions.version).where(TableVersions.table_name.in_(tables))
+    versions = dict(session.execute(stmt).all())
+    return tuple(versions.get(table, 0) for table in tables)
+
+def changed_tables(session):
+    return session.info.setdefault("changed_tables", set())
+
+@event.listens_for(db.session, "after_flush")
+def record_flushed_tables(session, flush_context):
+    tables = changed_tables(session)
+    tables.update(obj.__table__.name for obj in session.new)
+    tables.update(obj.__table__.name for obj in session.deleted)
+    tables.update(obj.__table__.name for obj in session.dirty if session.is_modified(obj))
+
+@event.listens_for(db.session, "do_orm_execute")
+def record_executed_tables(orm_execute_state):
+    # bulk insert(Model) / update(Model) / delete(Model) statements never go through a flush;
+    # execution_options(bump_versions=False) marks those whose caller bumps the table itself
+    if not orm_execute_state.execution_options.get("bump_versions", True):
+        return
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        changed_tables(orm_execute_state.session).add(orm_execute_state.statement.table.name)
+
+@event.listens_for(db.session, "before_commit")
+def bump_changed_tables(session):
+    session.flush()
+    tables = session.info.pop("changed_tables", None)
+    if tables:
+        bump_versions(session.connection(), tables)
+
+@event.listens_for(db.session, "after_rollback")
+def forget_changed_tables(session):
+    session.info.pop("changed_tables", None)
+
+def make_etag(versions):
+    key = "%s?%s|%s|%s" % (
+        request.path, request.query_string.decode(), request.headers.get("Accept", ""), ",".join(map(str, versions))
+    )
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def conditional(*tables):
+    # tables: every table whose rows end up in the response
+    def decorator(view):
+        @wraps(view)
+        def wrapper(**kwargs):
+            g.etag = make_etag(current_versions(tables))
+            if request.if_none_match.contains(g.etag):
+                response = current_app.response_class(status=304)
+                response.set_etag(g.etag)
+                return response
+            response = make_response(view(**kwargs))
+            if response.status_code == 200:
+                response.set_etag(g.etag)
+                response.vary.add("Accept")
+            return response
+        return wrapper
+    return decorator
@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+# read when app.py is imported: a throwaway SQLite file, no response cache
+# (every request reaches the database) and the favorites cache on FakeRedis
+os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "test.db")
+os.environ.pop("DATABASE_READ_URL", None)
+os.environ["RESPONSE_CACHE_SIZE"] = "0"
+os.environ["FAVORITES_CACHE_URL"] = "fake://"
+
+from app import app as flask_app  # noqa: E402
+from models import db  # noqa: E402
+
+@pytest.fixture(scope="session")
+def app():
+    return flask_app
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture(scope="session")
+def engine(app):
+    with app.app_context():
+        return db.engine
+
+def generate(app, **counts):
+    """Replaces every table with `flask data generate` rows, 0 for the tables left out."""
+    args = ["data", "generate", "--yes"]
+    for table in ("users", "people", "planets", "species", "vehicles", "favorites"):
+        args += ["--" + table, str(counts.get(table, 0))]
+    result = app.test_cli_runner().invoke(args=args)
+    assert result.exit_code == 0, result.output
+
+@pytest.fixture
+def seed(app):
+    """seed(people=30, ...): generate() for one test."""
+    return lambda **counts: generate(app, **counts)
@@ -0,0 +1,70 @@
+"""
+The favorites cache on FakeRedis (FAVORITES_CACHE_URL=fake://, see
+conftest.py): patched by the favorite routes, dropped by any other write
+to the same user's favorites and by nothing else.
+"""
+from sqlalchemy import delete, select
+from favorites import change_favorites
+from favorites_cache import favorites_cache, FakeRedis
+from models import db, Favorites
+
+ITEMS = {"planets": 3, "species": 3, "people": 3, "vehicles": 3, "users": 2}
+
+def favorite_items(client):
+    response = client.get("/users/favorites")
+    assert response.status_code == 200
+    return [(row["item_type"], row["item_id"]) for row in response.get_json()]
+
+def hits():
+    return favorites_cache.stats()["hits"]
+
+def test_store_is_fake_redis():
+    assert isinstance(favorites_cache.client, FakeRedis)
+
+def test_favorite_routes_patch_the_cached_set(client, seed):
+    seed(**ITEMS)
+    assert favorite_items(client) == []
+    assert client.post("/favorite/people/2").status_code == 201
+    assert client.post("/favorite/planet/1").status_code == 201
+    before = hits()
+    assert favorite_items(client) == [("person", 2), ("planet", 1)]
+    assert hits() == before + 1
+    assert client.delete("/favorite/people/2").status_code == 200
+    assert favorite_items(client) == [("planet", 1)]
+    assert hits() == before + 2
+
+def test_other_writes_invalidate_the_cached_set(app, client, seed):
+    seed(**ITEMS)
+    assert client.post("/favorite/vehicle/3").status_code == 201
+    assert favorite_items(client) == [("vehicle", 3)]
+    # bypasses favorites.py, like Flask-Admin or another service would
+    with app.app_context():
+        db.session.execute(delete(Favorites))
+        db.session.commit()
+    before = hits()
+    assert favorite_items(client) == []
+    assert hits() == before
+
+def test_orm_writes_invalidate_the_cached_set(app, client, seed):
+    seed(**ITEMS)
+    assert client.post("/favorite/species/1").status_code == 201
+    assert client.post("/favorite/species/2").status_code == 201
+    assert favorite_items(client) == [("species", 1), ("species", 2)]
+    with app.app_context():
+        db.session.delete(db.session.scalars(select(Favorites).where(Favorites.item_id == 1)).one())
+        db.session.commit()
+    before = hits()
+    assert favorite_items(client) == [("species", 2)]
+    assert hits() == before
+
+def test_other_users_writes_keep_the_cached_set(app, client, seed):
+    seed(**ITEMS)
+    assert client.post("/favorite/planet/2").status_code == 201
+    assert favorite_items(client) == [("planet", 2)]
+    with app.app_context():
+        change_favorites(2, add=[("planet", 2), ("person", 1)])
+    # a duplicate changes nothing, so it keeps the set too
+    assert client.post("/favorite/planet/2").status_code == 400
+    before = hits()
+    assert favorite_items(client) == [("planet", 2)]
+    assert hits() == before + 1
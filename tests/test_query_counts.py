@@ -0,0 +1,46 @@
+"""
+The list endpoints run a fixed number of statements, however many rows the
+tables hold: related rows are fetched per page, never per item. SMALL fits
+in one page, LARGE fills it and has many more relations per row.
+"""
+from contextlib import contextmanager
+import pytest
+from sqlalchemy import event
+
+SMALL = {"planets": 10, "species": 5, "people": 30, "vehicles": 5, "users": 5, "favorites": 40}
+LARGE = {"planets": 300, "species": 60, "people": 3000, "vehicles": 300, "users": 50, "favorites": 2000}
+
+# url -> statements per request, the table_versions read for the ETag included
+STATEMENTS = {
+    "/people": 3,
+    "/people?fields=name,species,homeworld": 2,
+    "/people?sort=-height&height__gte=100": 3,
+    "/planets": 5,
+    "/planets?fields=name,residents": 3,
+    "/species": 4,
+    "/vehicles": 3,
+}
+
+@contextmanager
+def statements(engine):
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        executed.append(statement)
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        yield executed
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+@pytest.mark.parametrize("size", [SMALL, LARGE], ids=["small", "large"])
+def test_list_statements_do_not_grow_with_rows(client, engine, seed, size):
+    seed(**size)
+    counts = {}
+    for url in STATEMENTS:
+        with statements(engine) as executed:
+            response = client.get(url)
+        assert response.status_code == 200, response.get_data(as_text=True)
+        assert response.get_json()
+        counts[url] = len(executed)
+    assert counts == STATEMENTS
@@ -0,0 +1,69 @@
+"""
+SQLite query plans of the list endpoints: the indexes they were built
+around stay in use on every page.
+"""
+import pytest
+from sqlalchemy import event
+from models import db
+from conftest import generate
+from utils import encode_cursor
+
+SIZE = {"planets": 200, "species": 50, "people": 5000, "vehicles": 10, "users": 5, "favorites": 50}
+
+@pytest.fixture(scope="module")
+def seeded(app):
+    generate(app, **SIZE)
+    # plan as on a migrated database that was never ANALYZEd, where a
+    # rowid range looks as cheap as any index
+    with app.app_context():
+        with db.engine.begin() as connection:
+            connection.exec_driver_sql("DROP TABLE IF EXISTS sqlite_stat1")
+        # open connections keep the statistics they loaded
+        db.engine.dispose()
+
+def query_plan(client, engine, url, table):
+    """The EXPLAIN QUERY PLAN steps that read table in the page query GET url runs."""
+    executed = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        if "FROM %s" % table in statement:
+            executed.append((statement, parameters))
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    statement, parameters = executed[0]
+    with engine.connect() as connection:
+        plan = [row[-1] for row in connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)]
+    return [step for step in plan if step.split(" ")[1:2] == [table]]
+
+@pytest.mark.parametrize("url", ["/people?name_prefix=ka", "/people?name_prefix=ka&after=2500"])
+def test_name_prefix_uses_the_lower_name_index(seeded, client, engine, url):
+    plan = query_plan(client, engine, url, "people")
+    assert "USING INDEX ix_people_name_lower" in plan[0], plan
+
+@pytest.mark.parametrize("url", ["/people?after=2500", "/people?species_id=3&after=2500"])
+def test_later_pages_seek_on_the_id(seeded, client, engine, url):
+    plan = query_plan(client, engine, url, "people")
+    assert "rowid>?" in plan[0], plan
+
+@pytest.mark.parametrize("sort", ["-height", "height", "name", "-name"])
+def test_sorted_pages_seek_on_the_sort_index(seeded, client, engine, sort):
+    url = "/people?sort=%s&limit=50" % sort
+    cursor = client.get(url).headers["X-Next-Cursor"]
+    pages = [url, url + "&after=" + cursor]
+    if sort.lstrip("-") != "name":
+        # a page of the rows without a height
+        pages.append(url + "&after=" + encode_cursor(None, 2500))
+    for page in pages:
+        plan = query_plan(client, engine, page, "people")
+        assert plan and all("USING INDEX ix_people_%s_id" % sort.lstrip("-") in step for step in plan), plan
+
+def test_sorted_name_prefix_uses_the_lower_name_index(seeded, client, engine):
+    url = "/people?sort=-height&name_prefix=ka&limit=5"
+    cursor = client.get(url).headers["X-Next-Cursor"]
+    for page in (url, url + "&after=" + cursor):
+        plan = query_plan(client, engine, page, "people")
+        assert plan and all("USING INDEX ix_people_name_lower" in step for step in plan), plan